@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+MJOS并发原语
+为多线程环境下的记忆系统提供读写锁和分段锁
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+class ReadWriteLock:
+    """读写锁：读者之间互不阻塞，写者独占
+
+    有写者等待时新来的读者先让行，避免持续的检索流量饿死写入。不可重入：
+    持有读锁时不能再申请读锁或写锁。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._condition:
+            self._writing = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """以读者身份持锁"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """以写者身份持锁"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class LockStripes:
+    """分段锁：按行号把计数器分到固定数量的锁上，不同段的更新互不阻塞"""
+
+    def __init__(self, stripes: int = 16):
+        if stripes & (stripes - 1):
+            raise ValueError("分段数必须是 2 的幂")
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._mask = stripes - 1
+
+    def partition(self, rows: Iterable[int]) -> List[Tuple[threading.Lock, List[int]]]:
+        """按所属分段归并行号，调用方对每段只需加锁一次"""
+        groups: Dict[int, List[int]] = {}
+        for row in rows:
+            groups.setdefault(row & self._mask, []).append(row)
+        return [(self._locks[stripe], stripe_rows) for stripe, stripe_rows in groups.items()]
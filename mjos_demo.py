@@ -5,11 +5,32 @@ MJOS智能协作系统演示
 """
 
 import asyncio
+import bisect
+import hashlib
+import heapq
 import json
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from pathlib import Path
+from typing import Dict, List, Any, Optional, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Set, Tuple, Union
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
+from itertools import accumulate
+from queue import Empty, SimpleQueue
+
+from mjos_concurrency import LockStripes, ReadWriteLock
+from mjos_memory_index import MinHashLSH, NGramIndex, TagIndex
+from mjos_memory_scoring import MemoryEvictionPolicy, MemoryScorer
+from mjos_memory_table import MemoryRecord, MemoryTable
+from mjos_memory_tiers import ColdMemoryStore
+from mjos_rules import KeywordRuleEngine
+from mjos_snapshot import SnapshotReader, write_snapshot
 
 # ============================================================================
 # MJOS核心类型定义
@@ -21,17 +42,111 @@ class MJOSRole(Enum):
     XIAOMEI = "莫小美"  # 用户体验，界面优化
     XIAOMA = "莫小码"   # 技术实现，代码质量
 
-@dataclass
+# 角色观点文本池：观点来自有限的规则表，决策只保存其整数ID
+_perspective_pool: List[str] = []
+_perspective_ids: Dict[str, int] = {}
+
+def intern_perspective(text: str) -> int:
+    """登记观点文本并返回其ID，相同文本共享同一ID"""
+    perspective_id = _perspective_ids.get(text)
+    if perspective_id is None:
+        perspective_id = len(_perspective_pool)
+        _perspective_pool.append(text)
+        _perspective_ids[text] = perspective_id
+    return perspective_id
+
+def perspective_text(perspective_id: int) -> str:
+    """按ID取回观点文本"""
+    return _perspective_pool[perspective_id]
+
+@lru_cache(maxsize=1024)
+def render_final_decision(perspective_ids: Tuple[int, int, int]) -> str:
+    """按综合决策模板渲染最终决策文本（只依赖三个观点，结果可复用）"""
+    xiaozhi, xiaomei, xiaoma = (perspective_text(perspective_id) for perspective_id in perspective_ids)
+    
+    return f"""
+基于MJOS三角协作分析，综合决策如下：
+
+🎯 战略层面：{xiaozhi[:50]}...
+🎨 体验层面：{xiaomei[:50]}...
+💻 技术层面：{xiaoma[:50]}...
+
+📊 综合建议：
+1. 采用分阶段实施策略，平衡战略目标、用户体验和技术可行性
+2. 建立跨职能协作机制，确保各个角度的需求都得到充分考虑
+3. 设立明确的成功指标，定期评估和调整实施方案
+4. 重视用户反馈，持续优化和改进
+
+这个决策综合了战略思维、用户体验和技术实现的多重考量，具有较高的可行性和成功概率。
+        """.strip()
+
+# 计时顺序：三个角色（按 MJOSRole 顺序）+ 综合决策
+TIMING_LABELS = tuple(role.value for role in MJOSRole) + ("综合决策",)
+
+@dataclass(slots=True)
 class MJOSDecision:
-    """MJOS协作决策"""
+    """MJOS协作决策
+    
+    只保存观点ID与各阶段耗时，观点文本和 final_decision 在访问时才取回/渲染。
+    """
     decision_id: str
     problem: str
-    xiaozhi_perspective: str
-    xiaomei_perspective: str
-    xiaoma_perspective: str
-    final_decision: str
+    perspective_ids: Tuple[int, int, int]  # 莫小智、莫小美、莫小码的观点ID
     confidence: float
     timestamp: datetime
+    timings: Tuple[float, ...] = ()  # 按 TIMING_LABELS 顺序的耗时（秒），缓存命中时为空
+    
+    @property
+    def xiaozhi_perspective(self) -> str:
+        return perspective_text(self.perspective_ids[0])
+    
+    @property
+    def xiaomei_perspective(self) -> str:
+        return perspective_text(self.perspective_ids[1])
+    
+    @property
+    def xiaoma_perspective(self) -> str:
+        return perspective_text(self.perspective_ids[2])
+    
+    @property
+    def final_decision(self) -> str:
+        return render_final_decision(self.perspective_ids)
+    
+    @property
+    def role_timings(self) -> Dict[str, float]:
+        """各角色思考耗时（秒）"""
+        return dict(zip(TIMING_LABELS, self.timings))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典"""
+        return {
+            "decision_id": self.decision_id,
+            "problem": self.problem,
+            "xiaozhi_perspective": self.xiaozhi_perspective,
+            "xiaomei_perspective": self.xiaomei_perspective,
+            "xiaoma_perspective": self.xiaoma_perspective,
+            "final_decision": self.final_decision,
+            "confidence": self.confidence,
+            "timestamp": self.timestamp.isoformat(),
+            "role_timings": self.role_timings
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MJOSDecision":
+        """从字典恢复决策（final_decision 由观点重新渲染）"""
+        role_timings = data.get("role_timings", {})
+        return cls(
+            decision_id=data["decision_id"],
+            problem=data["problem"],
+            perspective_ids=(
+                intern_perspective(data["xiaozhi_perspective"]),
+                intern_perspective(data["xiaomei_perspective"]),
+                intern_perspective(data["xiaoma_perspective"])
+            ),
+            confidence=data["confidence"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            timings=tuple(role_timings[label] for label in TIMING_LABELS if label in role_timings)
+        )
 
 class TaskStatus(Enum):
     """任务状态"""
@@ -51,6 +166,310 @@ class MJOSTask:
     progress: float
     created_at: datetime
 
+# ============================================================================
+# MJOS决策缓存
+# ============================================================================
+
+def decision_cache_key(problem: str, context: Dict[str, Any] = None) -> str:
+    """生成决策缓存键：规范化问题文本与上下文后取哈希"""
+    normalized_problem = " ".join(problem.split())
+    normalized_context = json.dumps(context or {}, sort_keys=True, ensure_ascii=False, default=str)
+    raw = f"{normalized_problem}\x00{normalized_context}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class MJOSDecisionCache:
+    """MJOS决策缓存（TTL过期 + LRU淘汰）"""
+    
+    def __init__(self, max_size: int = 256, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl  # 秒
+        self._entries: "OrderedDict[str, Tuple[float, MJOSDecision]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[MJOSDecision]:
+        """查询缓存，过期条目视为未命中"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, decision = entry
+            if time.monotonic() - stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return decision
+            del self._entries[key]
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key: str, decision: MJOSDecision):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._entries[key] = (time.monotonic(), decision)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+# ============================================================================
+# MJOS决策历史
+# ============================================================================
+
+class MJOSDecisionHistory:
+    """有界决策历史：内存中保留最近的决策，较早的决策溢出到追加写入的段文件
+    
+    指定的 segment_path 已存在时，打开时先为其中的决策建立索引，之后的溢出接在末尾继续写入；
+    末尾不完整的记录（写入中途崩溃）会被截掉。
+    """
+    
+    def __init__(self, capacity: int = 1000, segment_path: Optional[str] = None):
+        self.capacity = capacity
+        self.segment_path = Path(segment_path) if segment_path else None
+        self._recent: deque = deque()
+        self._recent_index: Dict[str, MJOSDecision] = {}
+        
+        # 段文件索引：decision_id -> 溢出序号，序号对应的偏移、长度和时间戳
+        self._segment = None
+        self._spilled_positions: Dict[str, int] = {}
+        self._pending_ids: Optional[bytes] = None  # 快照恢复的决策ID，首次按ID查询时才建立索引
+        
+        # 从快照恢复的决策仍保存在快照文件中，前 _snapshot_count 个溢出序号直接从快照文件读取
+        self._snapshot_file = None
+        self._snapshot_base = 0
+        self._snapshot_count = 0
+        self._spilled_offsets = array('q')
+        self._spilled_lengths = array('l')
+        self._spilled_times = array('d')
+        
+        if self.segment_path is not None and self.segment_path.exists():
+            self._index_segment()
+    
+    def append(self, decision: MJOSDecision):
+        """追加决策，超出容量时将最早的决策写入段文件"""
+        self._recent.append(decision)
+        self._recent_index[decision.decision_id] = decision
+        
+        while len(self._recent) > self.capacity:
+            self._spill(self._recent.popleft())
+    
+    def get(self, decision_id: str) -> Optional[MJOSDecision]:
+        """按ID获取决策"""
+        decision = self._recent_index.get(decision_id)
+        if decision is not None:
+            return decision
+        
+        position = self._positions().get(decision_id)
+        if position is None:
+            return None
+        return self._read_spilled(position)
+    
+    def between(self, start: datetime, end: datetime) -> Iterator[MJOSDecision]:
+        """按时间范围 [start, end] 遍历决策"""
+        first = bisect.bisect_left(self._spilled_times, start.timestamp())
+        last = bisect.bisect_right(self._spilled_times, end.timestamp())
+        for position in range(first, last):
+            yield self._read_spilled(position)
+        
+        for decision in list(self._recent):
+            if start <= decision.timestamp <= end:
+                yield decision
+    
+    def snapshot_sections(self) -> Dict[str, bytes]:
+        """导出快照分段：全部决策按段文件格式依次排列，附带偏移、长度、时间戳和ID索引"""
+        spilled = len(self._spilled_offsets)
+        
+        # 已溢出的决策直接复制原始记录，不做解码
+        chunks = [
+            self._read_records(start, end)
+            for start, end in ((0, self._snapshot_count), (self._snapshot_count, spilled))
+            if start < end
+        ]
+        recent = [json.dumps(decision.to_dict(), ensure_ascii=False).encode('utf-8') + b"\n"
+                  for decision in self._recent]
+        chunks.extend(recent)
+        
+        lengths = array('l', self._spilled_lengths)
+        lengths.extend(len(record) for record in recent)
+        offsets = array('q', accumulate(lengths, initial=0))
+        offsets.pop()
+        times = array('d', self._spilled_times)
+        times.extend(decision.timestamp.timestamp() for decision in self._recent)
+        
+        ids = [""] * spilled
+        for decision_id, position in self._positions().items():
+            ids[position] = decision_id
+        ids.extend(decision.decision_id for decision in self._recent)
+        
+        return {
+            "segment": b"".join(chunks),
+            "offsets": offsets.tobytes(),
+            "lengths": lengths.tobytes(),
+            "times": times.tobytes(),
+            "ids": "\n".join(ids).encode('utf-8')
+        }
+    
+    def restore_snapshot(self, reader, prefix: str = ""):
+        """从快照分段恢复决策历史：只加载索引列，决策在读取时才从快照文件中解码"""
+        self.apply_snapshot(self.stage_snapshot(reader, prefix))
+    
+    def stage_snapshot(self, reader, prefix: str = "") -> Dict[str, Any]:
+        """读出快照中的索引列，不改动现有状态
+        
+        返回值交给 apply_snapshot() 替换当前决策历史，或交给 discard_snapshot() 丢弃。
+        """
+        offsets = array('q')
+        offsets.frombytes(reader.section(prefix + "offsets"))
+        lengths = array('l')
+        lengths.frombytes(reader.section(prefix + "lengths"))
+        times = array('d')
+        times.frombytes(reader.section(prefix + "times"))
+        ids = bytes(reader.section(prefix + "ids")) if len(offsets) else None
+        base, _ = reader.extent(prefix + "segment")
+        return {
+            "offsets": offsets, "lengths": lengths, "times": times, "ids": ids,
+            "base": base, "file": open(reader.path, 'rb')
+        }
+    
+    def discard_snapshot(self, staged: Dict[str, Any]):
+        """丢弃 stage_snapshot() 读出的状态"""
+        staged["file"].close()
+    
+    def apply_snapshot(self, staged: Dict[str, Any]):
+        """以 stage_snapshot() 读出的状态替换当前决策历史"""
+        self.close()
+        if self.segment_path is not None and self.segment_path.exists():
+            self.segment_path.write_bytes(b"")  # 原段文件中的决策已被快照取代
+        self._recent.clear()
+        self._recent_index.clear()
+        self._spilled_positions = {}
+        
+        self._spilled_offsets = staged["offsets"]
+        self._spilled_lengths = staged["lengths"]
+        self._spilled_times = staged["times"]
+        self._pending_ids = staged["ids"]
+        self._snapshot_file = staged["file"]
+        self._snapshot_base = staged["base"]
+        self._snapshot_count = len(self._spilled_offsets)
+    
+    def close(self):
+        """关闭段文件"""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._snapshot_file is not None:
+            self._snapshot_file.close()
+            self._snapshot_file = None
+            self._snapshot_count = 0
+    
+    def __len__(self) -> int:
+        return len(self._spilled_offsets) + len(self._recent)
+    
+    def __iter__(self) -> Iterator[MJOSDecision]:
+        for position in range(len(self._spilled_offsets)):
+            yield self._read_spilled(position)
+        yield from list(self._recent)
+    
+    def __getitem__(self, index: int) -> MJOSDecision:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("decision history index out of range")
+        
+        spilled = len(self._spilled_offsets)
+        if index < spilled:
+            return self._read_spilled(index)
+        return self._recent[index - spilled]
+    
+    def _open_segment(self):
+        """打开（必要时创建）段文件"""
+        if self._segment is None:
+            if self.segment_path is not None:
+                self.segment_path.parent.mkdir(parents=True, exist_ok=True)
+                self._segment = open(self.segment_path, 'a+b')
+            else:
+                self._segment = tempfile.TemporaryFile()
+        return self._segment
+    
+    def _index_segment(self):
+        """为已有段文件中的决策建立偏移、长度、时间戳和ID索引"""
+        segment = self._open_segment()
+        segment.seek(0)
+        offset = 0
+        for record in segment:
+            if not record.endswith(b"\n"):
+                break
+            data = json.loads(record)
+            self._spilled_positions[data["decision_id"]] = len(self._spilled_offsets)
+            self._spilled_offsets.append(offset)
+            self._spilled_lengths.append(len(record))
+            self._spilled_times.append(datetime.fromisoformat(data["timestamp"]).timestamp())
+            offset += len(record)
+        segment.truncate(offset)
+    
+    def _positions(self) -> Dict[str, int]:
+        """溢出决策的ID索引，快照恢复后在首次使用时建立"""
+        if self._pending_ids is not None:
+            ids = self._pending_ids.decode('utf-8').split("\n")
+            self._spilled_positions = dict(zip(ids, range(len(ids))))
+            self._pending_ids = None
+        return self._spilled_positions
+    
+    def _spill(self, decision: MJOSDecision):
+        """将决策追加写入段文件并登记索引"""
+        segment = self._open_segment()
+        record = json.dumps(decision.to_dict(), ensure_ascii=False).encode('utf-8') + b"\n"
+        segment.seek(0, 2)
+        offset = segment.tell()
+        segment.write(record)
+        
+        self._positions()[decision.decision_id] = len(self._spilled_offsets)
+        self._spilled_offsets.append(offset)
+        self._spilled_lengths.append(len(record))
+        self._spilled_times.append(decision.timestamp.timestamp())
+        del self._recent_index[decision.decision_id]
+    
+    def _locate(self, position: int) -> Tuple[Any, int]:
+        """已溢出决策所在的文件及文件内偏移"""
+        if position < self._snapshot_count:
+            return self._snapshot_file, self._snapshot_base + self._spilled_offsets[position]
+        return self._segment, self._spilled_offsets[position]
+    
+    def _read_record(self, position: int) -> bytes:
+        """读取已溢出决策的原始记录"""
+        segment, offset = self._locate(position)
+        segment.seek(offset)
+        return segment.read(self._spilled_lengths[position])
+    
+    def _read_records(self, start: int, end: int) -> bytes:
+        """读取同一文件中 [start, end) 的原始记录，首尾相连时整段读取"""
+        segment, offset = self._locate(start)
+        size = sum(self._spilled_lengths[start:end])
+        if self._spilled_offsets[end - 1] + self._spilled_lengths[end - 1] - self._spilled_offsets[start] == size:
+            segment.seek(offset)
+            return segment.read(size)
+        return b"".join(self._read_record(position) for position in range(start, end))
+    
+    def _read_spilled(self, position: int) -> MJOSDecision:
+        """从段文件读取已溢出的决策"""
+        return MJOSDecision.from_dict(json.loads(self._read_record(position)))
+
 # ============================================================================
 # MJOS协作引擎
 # ============================================================================
@@ -58,161 +477,1050 @@ class MJOSTask:
 class MJOSCollaborationEngine:
     """MJOS协作引擎"""
     
-    def __init__(self):
-        self.decision_history = []
+    def __init__(self, concurrent: bool = True, decision_cache: Optional[MJOSDecisionCache] = None,
+                 rule_engine: Optional[KeywordRuleEngine] = None,
+                 decision_history: Optional[MJOSDecisionHistory] = None):
+        self.decision_history = decision_history if decision_history is not None else MJOSDecisionHistory()
         self.collaboration_count = 0
+        self.concurrent = concurrent  # 三个角色是否并发思考
+        self.decision_cache = decision_cache
+        self.rule_engine = rule_engine if rule_engine is not None else KeywordRuleEngine()
     
     async def collaborate(self, problem: str, context: Dict[str, Any] = None) -> MJOSDecision:
         """MJOS三角协作决策"""
         if context is None:
             context = {}
         
-        print(f"\n🧠 MJOS协作开始：{problem}")
-        print("=" * 60)
+        cache_key = None
+        if self.decision_cache is not None:
+            cache_key = decision_cache_key(problem, context)
+            cached = self.decision_cache.get(cache_key)
+            if cached is not None:
+                return self._replay_cached(problem, cached)
+        
+        thinkers = self._role_thinkers()
+        matches = self.rule_engine.scan(problem)  # 一次扫描得到所有角色的关键词匹配
         
-        # 莫小智的战略思考
-        xiaozhi_perspective = await self._xiaozhi_think(problem, context)
-        print(f"🎯 {MJOSRole.XIAOZHI.value}: {xiaozhi_perspective}")
+        if self.concurrent:
+            # 三个角色同时思考，总耗时取决于最慢的角色
+            results = await asyncio.gather(
+                *(self._timed(think(problem, context, matches)) for _, think in thinkers)
+            )
+        else:
+            results = [await self._timed(think(problem, context, matches)) for _, think in thinkers]
+        
+        perspectives = {role: result for (role, _), result in zip(thinkers, results)}
+        return await self._finish_decision(problem, perspectives, cache_key)
+    
+    async def iter_collaborate(self, problem: str, context: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """流式三角协作：每个角色完成即产出其观点，最后产出综合决策"""
+        if context is None:
+            context = {}
         
-        # 莫小美的用户体验思考
-        xiaomei_perspective = await self._xiaomei_think(problem, context)
-        print(f"🎨 {MJOSRole.XIAOMEI.value}: {xiaomei_perspective}")
+        cache_key = None
+        if self.decision_cache is not None:
+            cache_key = decision_cache_key(problem, context)
+            cached = self.decision_cache.get(cache_key)
+            if cached is not None:
+                decision = self._replay_cached(problem, cached)
+                for role, perspective in zip(MJOSRole, self._perspectives_of(decision)):
+                    yield {"type": "perspective", "role": role.value, "perspective": perspective, "elapsed": 0.0}
+                yield {"type": "decision", "decision": decision}
+                return
         
-        # 莫小码的技术实现思考
-        xiaoma_perspective = await self._xiaoma_think(problem, context)
-        print(f"💻 {MJOSRole.XIAOMA.value}: {xiaoma_perspective}")
+        matches = self.rule_engine.scan(problem)
+        
+        async def think_as(role: MJOSRole, think) -> Tuple[MJOSRole, Tuple[str, float]]:
+            return role, await self._timed(think(problem, context, matches))
+        
+        pending = [asyncio.ensure_future(think_as(role, think)) for role, think in self._role_thinkers()]
+        perspectives = {}
+        try:
+            for next_done in asyncio.as_completed(pending):
+                role, (perspective, elapsed) = await next_done
+                perspectives[role] = (perspective, elapsed)
+                yield {"type": "perspective", "role": role.value, "perspective": perspective, "elapsed": elapsed}
+        finally:
+            # 调用方提前结束迭代时，取消尚未完成的角色思考
+            for task in pending:
+                task.cancel()
+        
+        decision = await self._finish_decision(problem, perspectives, cache_key)
+        yield {"type": "decision", "decision": decision}
+    
+    def _role_thinkers(self) -> List[Tuple[MJOSRole, Any]]:
+        """按固定顺序列出各角色的思考方法"""
+        return [
+            (MJOSRole.XIAOZHI, self._xiaozhi_think),
+            (MJOSRole.XIAOMEI, self._xiaomei_think),
+            (MJOSRole.XIAOMA, self._xiaoma_think),
+        ]
+    
+    @staticmethod
+    def _perspectives_of(decision: MJOSDecision) -> Tuple[str, str, str]:
+        """按角色顺序取出决策中的三个观点"""
+        return decision.xiaozhi_perspective, decision.xiaomei_perspective, decision.xiaoma_perspective
+    
+    async def _finish_decision(self, problem: str, perspectives: Dict[MJOSRole, Tuple[str, float]],
+                               cache_key: Optional[str]) -> MJOSDecision:
+        """综合各角色观点，记录并输出最终决策"""
+        perspective_ids = tuple(intern_perspective(perspectives[role][0]) for role in MJOSRole)
         
         # 综合决策
-        final_decision = await self._synthesize_decision(
-            problem, xiaozhi_perspective, xiaomei_perspective, xiaoma_perspective
-        )
+        perspective_ids, synthesis_time = await self._timed(self._synthesize_decision(problem, perspective_ids))
         
         decision = MJOSDecision(
             decision_id=f"mjos_{self.collaboration_count:04d}",
             problem=problem,
-            xiaozhi_perspective=xiaozhi_perspective,
-            xiaomei_perspective=xiaomei_perspective,
-            xiaoma_perspective=xiaoma_perspective,
-            final_decision=final_decision,
+            perspective_ids=perspective_ids,
             confidence=0.85,
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            timings=tuple(perspectives[role][1] for role in MJOSRole) + (synthesis_time,)
         )
         
         self.decision_history.append(decision)
         self.collaboration_count += 1
         
-        print(f"\n🤖 MJOS最终决策：{final_decision}")
+        if cache_key is not None:
+            self.decision_cache.put(cache_key, decision)
+        
+        # 完成后一次性输出，并发协作时各决策的输出互不穿插
+        print(f"\n🧠 MJOS协作开始：{problem}")
+        print("=" * 60)
+        print(f"🎯 {MJOSRole.XIAOZHI.value}: {decision.xiaozhi_perspective}")
+        print(f"🎨 {MJOSRole.XIAOMEI.value}: {decision.xiaomei_perspective}")
+        print(f"💻 {MJOSRole.XIAOMA.value}: {decision.xiaoma_perspective}")
+        print(f"\n🤖 MJOS最终决策：{decision.final_decision}")
         print("=" * 60)
         
         return decision
     
-    async def _xiaozhi_think(self, problem: str, context: Dict[str, Any]) -> str:
+    def get_decision(self, decision_id: str) -> Optional[MJOSDecision]:
+        """按ID查询历史决策"""
+        return self.decision_history.get(decision_id)
+    
+    async def collaborate_many(self, problems: List[str], contexts: List[Dict[str, Any]] = None,
+                               max_concurrency: int = 4) -> List[Union[MJOSDecision, Exception]]:
+        """批量协作决策，结果按输入顺序返回，单个失败不影响其他问题"""
+        if contexts is None:
+            contexts = [None] * len(problems)
+        if len(contexts) != len(problems):
+            raise ValueError("problems 与 contexts 数量不一致")
+        
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def run_one(problem: str, context: Dict[str, Any]) -> Union[MJOSDecision, Exception]:
+            async with semaphore:
+                try:
+                    return await self.collaborate(problem, context)
+                except Exception as e:
+                    return e
+        
+        return await asyncio.gather(
+            *(run_one(problem, context) for problem, context in zip(problems, contexts))
+        )
+    
+    def _replay_cached(self, problem: str, cached: MJOSDecision) -> MJOSDecision:
+        """基于缓存的决策生成新的决策记录"""
+        decision = MJOSDecision(
+            decision_id=f"mjos_{self.collaboration_count:04d}",
+            problem=problem,
+            perspective_ids=cached.perspective_ids,
+            confidence=cached.confidence,
+            timestamp=datetime.now()
+        )
+        
+        self.decision_history.append(decision)
+        self.collaboration_count += 1
+        
+        print(f"\n⚡ MJOS决策缓存命中：{problem} (复用 {cached.decision_id})")
+        return decision
+    
+    @staticmethod
+    async def _timed(coro: Awaitable[str]) -> Tuple[str, float]:
+        """执行思考协程并记录耗时"""
+        started = time.perf_counter()
+        result = await coro
+        return result, time.perf_counter() - started
+    
+    async def _xiaozhi_think(self, problem: str, context: Dict[str, Any],
+                             matches: Optional[Dict[str, int]] = None) -> str:
         """莫小智的战略思考"""
         await asyncio.sleep(0.1)  # 模拟思考时间
         
-        if "系统" in problem or "架构" in problem:
-            return "从战略角度看，需要建立可扩展的架构基础，确保长期技术竞争力。建议采用模块化设计，为未来发展预留空间。"
-        elif "用户" in problem or "体验" in problem:
-            return "战略重点应该放在用户价值创造上。建议深入分析用户需求，制定差异化的价值主张。"
-        elif "性能" in problem or "优化" in problem:
-            return "从战略视角，性能优化应该与业务目标对齐。建议优先优化核心业务流程，提升整体竞争优势。"
-        else:
-            return "建议从全局视角分析问题，制定系统性解决方案，确保决策与长期战略目标一致。"
+        if matches is None:
+            matches = self.rule_engine.scan(problem)
+        return self.rule_engine.resolve("xiaozhi", matches)
     
-    async def _xiaomei_think(self, problem: str, context: Dict[str, Any]) -> str:
+    async def _xiaomei_think(self, problem: str, context: Dict[str, Any],
+                             matches: Optional[Dict[str, int]] = None) -> str:
         """莫小美的用户体验思考"""
         await asyncio.sleep(0.1)  # 模拟思考时间
         
-        if "界面" in problem or "UI" in problem:
-            return "用户体验设计应该遵循简洁直观的原则。建议采用用户中心的设计方法，通过原型测试验证设计效果。"
-        elif "流程" in problem or "操作" in problem:
-            return "优化用户操作流程，减少认知负担。建议简化操作步骤，提供清晰的视觉反馈和引导。"
-        elif "性能" in problem:
-            return "从用户体验角度，响应速度直接影响用户满意度。建议优化关键交互的响应时间，提供加载状态提示。"
-        else:
-            return "建议从用户角度思考问题，确保解决方案能够提升用户满意度和使用效率。"
+        if matches is None:
+            matches = self.rule_engine.scan(problem)
+        return self.rule_engine.resolve("xiaomei", matches)
     
-    async def _xiaoma_think(self, problem: str, context: Dict[str, Any]) -> str:
+    async def _xiaoma_think(self, problem: str, context: Dict[str, Any],
+                            matches: Optional[Dict[str, int]] = None) -> str:
         """莫小码的技术实现思考"""
         await asyncio.sleep(0.1)  # 模拟思考时间
         
-        if "架构" in problem or "系统" in problem:
-            return "技术架构应该考虑可维护性、可扩展性和性能。建议采用微服务架构，使用容器化部署，确保系统稳定性。"
-        elif "性能" in problem:
-            return "性能优化需要从多个层面考虑：算法优化、数据库优化、缓存策略、异步处理等。建议先进行性能分析，找出瓶颈点。"
-        elif "安全" in problem:
-            return "安全是技术实现的重要考虑。建议实施多层安全防护：身份认证、数据加密、访问控制、安全审计等。"
-        else:
-            return "技术实现应该遵循最佳实践，确保代码质量、可测试性和可维护性。建议采用敏捷开发方法，持续集成和部署。"
+        if matches is None:
+            matches = self.rule_engine.scan(problem)
+        return self.rule_engine.resolve("xiaoma", matches)
     
-    async def _synthesize_decision(self, problem: str, xiaozhi: str, xiaomei: str, xiaoma: str) -> str:
-        """综合三角思考，形成最终决策"""
+    async def _synthesize_decision(self, problem: str,
+                                   perspective_ids: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        """综合三角思考，形成最终决策
+        
+        返回决策模板参数（三个观点ID），最终文本由 render_final_decision 按需渲染。
+        """
         await asyncio.sleep(0.1)  # 模拟综合分析时间
         
-        return f"""
-基于MJOS三角协作分析，综合决策如下：
-
-🎯 战略层面：{xiaozhi[:50]}...
-🎨 体验层面：{xiaomei[:50]}...
-💻 技术层面：{xiaoma[:50]}...
-
-📊 综合建议：
-1. 采用分阶段实施策略，平衡战略目标、用户体验和技术可行性
-2. 建立跨职能协作机制，确保各个角度的需求都得到充分考虑
-3. 设立明确的成功指标，定期评估和调整实施方案
-4. 重视用户反馈，持续优化和改进
-
-这个决策综合了战略思维、用户体验和技术实现的多重考量，具有较高的可行性和成功概率。
-        """.strip()
+        return perspective_ids
 
 # ============================================================================
 # MJOS记忆系统
 # ============================================================================
 
+RecallKey = Tuple[str, int, Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]
+
+class MemoryRecallCache:
+    """记忆检索结果缓存（LRU）
+    
+    条目记录写入时记忆系统的代数，代数变化后条目即视为失效，失效无需逐条清理。
+    多个检索线程会同时读写缓存，各操作都是 O(1) 的，用一把短锁保护。
+    """
+    
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: "OrderedDict[RecallKey, Tuple[int, List[int], List[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: RecallKey, generation: int) -> Optional[Tuple[List[int], List[int]]]:
+        """查询缓存，返回 (匹配行, 排名前列的行)；代数不符的条目视为未命中"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, matched_rows, top_rows = entry
+                if entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return matched_rows, top_rows
+                del self._entries[key]
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: RecallKey, generation: int, matched_rows: List[int], top_rows: List[int]):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = (generation, matched_rows, top_rows)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
 class MJOSMemorySystem:
-    """MJOS智能记忆系统"""
+    """MJOS智能记忆系统
+    
+    可在多线程中共享：检索类方法持读锁，彼此不阻塞；存入、修改、删除、压缩等持写锁。
+    """
+    
+    RETRACK_BATCH = 1024  # 排队等待重新登记到淘汰堆的检索批次超过该值时，检索结束后顺带处理
+    SIMILARITY_BATCH = 256  # 相似度索引每次持写锁最多登记的记忆条数，批次之间释放锁
+    EVICTION_COMPACT_RATIO = 0.5  # 淘汰后已删除行或字符串池垃圾占比达到该值时顺带压缩
+    CONSOLIDATE_JACCARD = 0.9  # LSH 候选的精确 Jaccard 相似度达到该值才合并
     
-    def __init__(self):
-        self.memories = []
+    def __init__(self, scorer: Optional[MemoryScorer] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 recall_cache_size: int = 128, cold_dir: Optional[str] = None,
+                 cold_compression: str = "zlib", dedup_text: Optional[Callable[[str], str]] = None):
+        self.memories = MemoryTable()  # 列式存储，memories[row] 返回字典视图
         self.memory_count = 0
+        self._text_index = NGramIndex()  # 内容倒排索引，键为 memories 中的行号
+        self._tag_index = TagIndex()
+        self.scorer = scorer  # 为空时按重要性和访问次数排序，否则按评分器（含时间衰减）排序
+        self._last_decay_at = time.time()
+        
+        # 容量限制：超出条数或内容字节数上限时按淘汰策略移除记忆
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._eviction = MemoryEvictionPolicy() if max_entries or max_bytes else None
+        self.evictions = 0
+        self.evicted_bytes = 0
+        
+        # 近重复合并：按行号顺序增量处理，游标之前的记忆已登记到 LSH 索引。
+        # dedup_text 从记忆内容中取出参与比较的部分（如去掉由模板生成的公共文本），默认比较全文
+        self._dedup_index = MinHashLSH()
+        self._dedup_text = dedup_text
+        self._consolidate_cursor = 0
+        self.consolidated = 0
+        
+        # 行号小于该值的存活记忆已登记到倒排索引和淘汰堆；批量写入和快照恢复的记忆
+        # 推迟到首次检索、淘汰、合并或压缩时再整批登记
+        self._indexed_rows = 0
+        
+        # 检索结果缓存：存入、修改、删除记忆时代数加一，旧缓存随之失效；
+        # 缓存命中的访问次数先累积，在下次需要读取访问次数前统一写回
+        self.generation = 0
+        self._recall_cache = MemoryRecallCache(recall_cache_size) if recall_cache_size else None
+        self._pending_access: Dict[RecallKey, List[Any]] = {}
+        
+        # 相似度索引（依赖 NumPy）在首次相似度检索时才建立，行号小于水位的记忆已登记
+        self._similarity = None
+        self._similarity_rows = 0
+        
+        # 并发控制：访问次数按行号分段加锁、同段整批累加；检索命中的行需要在淘汰堆中
+        # 重新登记，堆只能由写者修改，因此先排队，由下一个写者统一处理
+        self._lock = ReadWriteLock()
+        self._access_stripes = LockStripes()
+        self._pending_lock = threading.Lock()
+        self._retrack: "SimpleQueue[List[int]]" = SimpleQueue()
+        
+        # 冷热分层：指定 cold_dir 时，demote_memories() 将陈旧记忆的内容压缩转入磁盘段，
+        # 冷记忆不在内容倒排索引中，检索时另行扫描冷存储，被返回时自动取回内存
+        self._cold = ColdMemoryStore(cold_dir, cold_compression) if cold_dir else None
+        self.memories.cold_store = self._cold
+        self.memories.lock = self._lock  # 返回给调用方的记忆视图读写字段时持锁
     
     def remember(self, content: str, importance: float = 0.5, tags: List[str] = None) -> str:
         """存储记忆"""
         if tags is None:
             tags = []
         
-        memory_id = f"mem_{self.memory_count:04d}"
-        memory = {
-            "id": memory_id,
-            "content": content,
-            "importance": importance,
-            "tags": tags,
-            "created_at": datetime.now(),
-            "access_count": 1
-        }
+        with self._lock.write():
+            self._bump_generation()
+            row = self.memories.append(content, importance, tags, time.time())
+            indexed = row == self._indexed_rows
+            if indexed:
+                self._text_index.add(row, content.lower())
+                self._tag_index.add(row, tags)
+                self._indexed_rows = row + 1
+            self.memory_count += 1
+            
+            print(f"🧠 记忆存储：{content[:50]}... (重要性: {importance})")
+            
+            memory_id = self.memories.memory_id(row)
+            if self._eviction is not None:
+                if indexed:
+                    self._eviction.track(self.memories, row)
+                self._enforce_capacity()  # 可能触发压缩，行号随之改变
+            return memory_id
+    
+    def remember_many(self, items: Iterable[Union[str, Dict[str, Any]]]) -> List[str]:
+        """批量存储记忆，返回记忆ID列表
         
-        self.memories.append(memory)
-        self.memory_count += 1
+        条目为内容字符串，或含 content、importance、tags 的字典。整批写入记忆表后
+        只输出一行汇总日志；倒排索引推迟到下次检索时整批登记，容量检查整批只做一次。
+        """
+        entries = []
+        for item in items:
+            if isinstance(item, str):
+                entries.append((item, 0.5, []))
+            else:
+                entries.append((item["content"], item.get("importance", 0.5), item.get("tags") or []))
         
-        print(f"🧠 记忆存储：{content[:50]}... (重要性: {importance})")
-        return memory_id
+        with self._lock.write():
+            self._bump_generation()
+            table = self.memories
+            rows = table.append_many(entries, time.time())
+            self.memory_count += len(rows)
+            memory_ids = [table.memory_id(row) for row in rows]
+            
+            print(f"🧠 批量记忆存储：{len(rows)} 条记忆")
+            
+            if self._eviction is not None:
+                self._enforce_capacity()
+            return memory_ids
     
-    def recall(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """检索记忆"""
-        relevant_memories = []
-        
-        for memory in self.memories:
-            if query.lower() in memory["content"].lower():
-                memory["access_count"] += 1
-                relevant_memories.append(memory)
+    def recall(self, query: str, limit: int = 5, tags_all: List[str] = None,
+               tags_any: List[str] = None, exclude: List[str] = None) -> List[Dict[str, Any]]:
+        """检索记忆
         
-        # 按重要性和访问次数排序
-        relevant_memories.sort(key=lambda x: (x["importance"], x["access_count"]), reverse=True)
+        可按标签过滤：tags_all 须全部带有，tags_any 至少带有一个，exclude 均不能带有。
+        """
+        query = query.lower()
+        key = (query, limit, tuple(tags_all or ()), tuple(tags_any or ()), tuple(exclude or ()))
         
-        result = relevant_memories[:limit]
+        with self._read_locked():
+            table = self.memories
+            cached = self._recall_cache.get(key, self.generation) if self._recall_cache is not None else None
+            if cached is not None:
+                # 缓存命中：不再扫描，匹配行的访问次数记入待写回
+                matched_rows, top_rows = cached
+                with self._pending_lock:
+                    pending = self._pending_access.get(key)
+                    if pending is None:
+                        self._pending_access[key] = [matched_rows, 1]
+                    else:
+                        pending[1] += 1
+            else:
+                self._flush_access()
+                
+                # 先用标签和内容倒排索引求候选集合（不读取内容），再按原有子串语义逐条校验
+                tag_rows, excluded_rows = self._tag_index.select(tags_all, tags_any, exclude)
+                
+                matched_rows = [
+                    row for row in self._hot_rows(self._candidate_rows(query, tag_rows, excluded_rows))
+                    if query in table.content(row).lower()
+                ]
+                if self._cold:
+                    matched_rows = sorted(matched_rows + self._cold_matches(query, tag_rows, excluded_rows))
+                self._add_access(matched_rows)
+                
+                top_rows = self._top_rows(matched_rows, limit)
+                if self._recall_cache is not None:
+                    self._recall_cache.put(key, self.generation, matched_rows, top_rows)
+            
+            result = [table[row] for row in top_rows]
+            cold_ids = self._cold_ids(top_rows)
+        if cold_ids:
+            self._promote(cold_ids)
         print(f"🔍 记忆检索：找到 {len(result)} 条相关记忆")
         
         return result
+    
+    def recall_many(self, queries: List[str], limit: int = 5, tags_all: List[str] = None,
+                    tags_any: List[str] = None, exclude: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """批量检索记忆，按查询顺序返回各自的结果
+        
+        各查询的候选行按行号合并后只遍历一次，每条记忆内容只解码一次；
+        访问次数在全部查询校验完成后统一累加，再分别排序。
+        """
+        lowered = [query.lower() for query in queries]
+        
+        with self._read_locked():
+            self._flush_access()
+            table = self.memories
+            tag_rows, excluded_rows = self._tag_index.select(tags_all, tags_any, exclude)
+            
+            # 各查询的候选集合（None 表示不受限制），按行号遍历它们的并集
+            candidate_sets = {
+                query: self._candidate_set(query, tag_rows, excluded_rows) for query in dict.fromkeys(lowered)
+            }
+            if any(candidates is None for candidates in candidate_sets.values()):
+                rows = self._live_rows(excluded_rows)
+            else:
+                rows = sorted(set().union(*candidate_sets.values()))
+            rows = self._hot_rows(rows)
+            
+            matched: Dict[str, List[int]] = {query: [] for query in lowered}
+            for row in rows:
+                text = None
+                for query, candidates in candidate_sets.items():
+                    if candidates is None or row in candidates:
+                        if text is None:
+                            text = table.content(row).lower()
+                        if query in text:
+                            matched[query].append(row)
+            if self._cold:
+                for query in candidate_sets:
+                    matched[query] = sorted(matched[query] + self._cold_matches(query, tag_rows, excluded_rows))
+            
+            self._add_access([row for query in lowered for row in matched[query]])
+            
+            top_rows = [self._top_rows(matched[query], limit) for query in lowered]
+            results = [[table[row] for row in rows] for rows in top_rows]
+            cold_ids = self._cold_ids([row for rows in top_rows for row in rows])
+        if cold_ids:
+            self._promote(cold_ids)
+        print(f"🔍 批量记忆检索：{len(queries)} 个查询，共找到 {sum(map(len, results))} 条相关记忆")
+        
+        return results
+    
+    def recall_similar(self, query: str, limit: int = 5, min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """相似度检索：按字符 n-gram TF-IDF 余弦相似度返回近似 top-k，不要求子串完全匹配
+        
+        首次调用时才导入 NumPy 并分批建立相似度索引，之后只增量登记新记忆。
+        冷记忆不占用相似度索引，检索时才从冷存储取出打分。
+        """
+        with self._read_locked(similarity=True):
+            self._flush_access()
+            table = self.memories
+            
+            scored = self._similarity.query(query, limit, min_score)
+            if self._cold:
+                scored = sorted(scored + self._cold_similar(query, min_score), key=lambda item: (-item[1], item[0]))
+                scored = scored[:limit]
+            self._add_access([row for row, _ in scored])
+            
+            result = [table[row] for row, _ in scored]
+            cold_ids = self._cold_ids([row for row, _ in scored])
+        if cold_ids:
+            self._promote(cold_ids)
+        print(f"🔍 相似记忆检索：找到 {len(result)} 条相关记忆")
+        
+        return result
+    
+    def get(self, memory_id: str) -> Optional[MemoryRecord]:
+        """按ID获取记忆，不存在或已删除时返回 None（不计入访问次数；冷记忆取回内存）"""
+        with self._lock.read():
+            self._flush_access()
+            row = self.memories.row_of(memory_id)
+            if row is None:
+                return None
+            result = self.memories[row]
+            cold_ids = self._cold_ids([row])
+        if cold_ids:
+            self._promote(cold_ids)
+        return result
+    
+    def touch(self, memory_id: str) -> bool:
+        """记录一次对记忆的访问（冷记忆取回内存）"""
+        with self._lock.read():
+            row = self.memories.row_of(memory_id)
+            if row is None:
+                return False
+            
+            self._add_access([row])
+            cold_ids = self._cold_ids([row])
+        if cold_ids:
+            self._promote(cold_ids)
+        return True
+    
+    def update(self, memory_id: str, content: Optional[str] = None, importance: Optional[float] = None,
+               tags: Optional[List[str]] = None) -> bool:
+        """修改记忆的内容、重要性或标签，未指定的字段保持不变"""
+        with self._lock.write():
+            table = self.memories
+            row = table.row_of(memory_id)
+            if row is None:
+                return False
+            self._bump_generation()
+            indexed = row < self._indexed_rows
+            
+            if content is not None:
+                if indexed:
+                    if not table.is_cold(row):
+                        self._text_index.remove(row, table.content(row).lower())
+                    self._text_index.add(row, content.lower())
+                table.set_content(row, content)
+                if self._similarity is not None and row < self._similarity_rows:
+                    self._similarity.add(row, content)
+                # 已登记的近重复签名按新内容重新登记
+                if row < self._consolidate_cursor:
+                    self._dedup_index.remove(row)
+                    self._dedup_index.add(row, self._dedup_index.signature(content.lower()))
+            
+            if importance is not None:
+                table.importance[row] = importance
+            
+            if tags is not None:
+                if indexed:
+                    self._tag_index.remove(row, table.tags(row))
+                    self._tag_index.add(row, tags)
+                table.set_tags(row, tags)
+            
+            print(f"✏️ 记忆更新：{memory_id}")
+            
+            if self._eviction is not None:
+                if indexed:
+                    self._eviction.track(table, row)
+                self._enforce_capacity()
+            return True
+    
+    def forget(self, memory_id: str) -> bool:
+        """删除记忆：只做删除标记，空间在 compact_memories() 时回收"""
+        with self._lock.write():
+            row = self.memories.row_of(memory_id)
+            if row is None:
+                return False
+            
+            self._delete_row(row)
+        print(f"🗑️ 记忆删除：{memory_id}")
+        return True
+    
+    def compact_memories(self, min_garbage_ratio: float = 0.0) -> int:
+        """压缩已删除的记忆，重排行号并回收字符串池空间，返回回收的行数
+        
+        已删除行占比低于 min_garbage_ratio 时不压缩；记忆ID保持不变，
+        压缩前 recall()/get() 返回的记忆视图按ID重新定位。
+        """
+        with self._lock.write():
+            garbage = self._compact(min_garbage_ratio)
+        
+        if garbage:
+            print(f"🧹 记忆压缩：回收 {garbage} 条已删除记忆")
+        return garbage
+    
+    def _compact(self, min_garbage_ratio: float = 0.0) -> int:
+        """compact_memories() 的实现，调用方持有写锁"""
+        table = self.memories
+        garbage = len(table) - table.live_count
+        if not garbage or garbage < min_garbage_ratio * len(table):
+            return 0
+        
+        self._bump_generation()
+        self._ensure_indexes()
+        kept = table.compact()
+        mapping = {row: new_row for new_row, row in enumerate(kept)}
+        self._text_index.remap(mapping)
+        self._tag_index.remap(mapping)
+        if self._eviction is not None:
+            self._eviction.remap(table, kept)
+        self._indexed_rows = len(kept)
+        self._dedup_index.remap(mapping)
+        if self._similarity is not None:
+            self._similarity.remap(mapping)
+            self._similarity_rows = bisect.bisect_left(kept, self._similarity_rows)
+        self._consolidate_cursor = bisect.bisect_left(kept, self._consolidate_cursor)
+        return garbage
+    
+    def decay_memories(self) -> int:
+        """按上次衰减以来经过的时间，批量衰减所有记忆的重要性"""
+        with self._lock.write():
+            self._bump_generation()
+            now = time.time()
+            scorer = self.scorer if self.scorer is not None else MemoryScorer()
+            decayed = scorer.decay(self.memories, self._last_decay_at, now)
+            self._last_decay_at = now
+        
+        print(f"⏳ 记忆衰减：{decayed} 条记忆的重要性已衰减")
+        return decayed
+    
+    def demote_memories(self, cold_after: float = 6 * 3600, hot_access: int = 3,
+                        segment_size: int = 1000) -> int:
+        """将创建超过 cold_after 秒且访问次数少于 hot_access 的记忆转入冷存储，返回转出条数
+        
+        每 segment_size 条写成一个压缩段；冷记忆移出内容倒排索引、近重复索引和相似度索引，
+        字符串池随之重建。未指定冷存储目录时不做任何事。
+        """
+        if self._cold is None:
+            return 0
+        
+        with self._lock.write():
+            self._ensure_indexes()
+            self._flush_access()
+            table = self.memories
+            cutoff = time.time() - cold_after
+            rows = [
+                row for row in range(len(table))
+                if table.alive[row] and not table.is_cold(row)
+                and table.created_at[row] < cutoff and table.access_count[row] < hot_access
+            ]
+            if not rows:
+                return 0
+            
+            # 转出的记忆较多时直接按剩余热记忆重建倒排索引，比逐条移除更快，也能释放集合占用的空间
+            hot_count = table.live_count - len(self._cold)
+            rebuild = len(rows) * 4 >= hot_count
+            for row in rows:
+                if not rebuild:
+                    self._text_index.remove(row, table.content(row).lower())
+                self._dedup_index.remove(row)
+                if self._similarity is not None:
+                    self._similarity.remove(row)
+            if self._similarity is not None:
+                self._similarity.shrink()
+            table.demote(rows, segment_size)
+            if rebuild:
+                self._text_index.clear()
+                self._text_index.add_many(
+                    (row, table.content(row).lower()) for row in range(len(table))
+                    if table.alive[row] and not table.is_cold(row)
+                )
+        
+        print(f"🧊 记忆分层：{len(rows)} 条记忆转入冷存储 (冷记忆共 {len(self._cold)} 条)")
+        return len(rows)
+    
+    def consolidate_memories(self, batch_size: int = 1000) -> int:
+        """增量合并近重复记忆，每次最多处理 batch_size 条新记忆，返回合并数
+        
+        LSH 候选须再经 shingle 集合的精确 Jaccard 校验（不低于 CONSOLIDATE_JACCARD）。
+        合并时保留较早的记忆：访问次数相加、重要性取最大值、标签取并集。
+        """
+        with self._lock.write():
+            self._ensure_indexes()
+            self._flush_access()
+            self._retrack_pending()
+            table = self.memories
+            end = min(len(table), self._consolidate_cursor + batch_size)
+            merged = 0
+            
+            for row in range(self._consolidate_cursor, end):
+                if not table.alive[row]:
+                    continue
+                
+                text = self._dedup_fingerprint(row)
+                shingles = self._dedup_index.shingles(text)
+                signature = self._dedup_index.signature(text)
+                keeper = self._dedup_index.find_duplicate(
+                    signature,
+                    lambda candidate: MinHashLSH.jaccard(
+                        shingles, self._dedup_index.shingles(self._dedup_fingerprint(candidate))
+                    ) >= self.CONSOLIDATE_JACCARD
+                )
+                if keeper is None:
+                    self._dedup_index.add(row, signature)
+                else:
+                    self._merge_into(keeper, row)
+                    merged += 1
+            
+            self._consolidate_cursor = end
+            self.consolidated += merged
+        if merged:
+            print(f"🧩 记忆合并：合并 {merged} 条近重复记忆 (累计 {self.consolidated} 条)")
+        return merged
+    
+    def _dedup_fingerprint(self, row: int) -> str:
+        """参与近重复比较的文本"""
+        content = self.memories.content(row)
+        if self._dedup_text is not None:
+            content = self._dedup_text(content)
+        return content.lower()
+    
+    async def consolidate_in_background(self, batch_size: int = 1000, interval: float = 0.0) -> int:
+        """分批合并所有待处理的记忆，批次之间让出事件循环"""
+        merged = 0
+        while self._consolidate_cursor < len(self.memories):
+            merged += self.consolidate_memories(batch_size)
+            await asyncio.sleep(interval)
+        return merged
+    
+    def stats(self) -> Dict[str, Any]:
+        """记忆系统统计"""
+        with self._lock.read():
+            return {
+                "total_memories": self.memory_count,
+                "live_memories": self.memories.live_count,
+                "deleted_memories": len(self.memories) - self.memories.live_count,
+                "content_bytes": self.memories.live_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "consolidated": self.consolidated,
+                "generation": self.generation,
+                "recall_cache": self._recall_cache.stats() if self._recall_cache is not None else None,
+                "cold_store": self._cold.stats() if self._cold is not None else None
+            }
+    
+    def snapshot_sections(self) -> Dict[str, bytes]:
+        """导出快照分段：记忆表各列和计数器（索引不写入快照，恢复后重建）"""
+        with self._lock.read():
+            self._flush_access()
+            state = {
+                "memory_count": self.memory_count,
+                "last_decay_at": self._last_decay_at,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "consolidated": self.consolidated
+            }
+            sections = {"state": json.dumps(state).encode('utf-8')}
+            sections.update(self.memories.snapshot_sections())
+            if self._cold is not None:
+                sections.update({"cold." + name: data for name, data in self._cold.snapshot_sections().items()})
+            return sections
+    
+    def restore_snapshot(self, reader, prefix: str = ""):
+        """从快照分段恢复记忆，替换当前全部记忆"""
+        self.apply_snapshot(self.stage_snapshot(reader, prefix))
+    
+    def stage_snapshot(self, reader, prefix: str = "") -> Dict[str, Any]:
+        """读出快照中的记忆表和冷存储段，不改动现有状态（快照与本系统不兼容时在此抛出）
+        
+        返回值交给 apply_snapshot() 替换当前全部记忆，或交给 discard_snapshot() 丢弃。
+        """
+        state = reader.json_section(prefix + "state")
+        memories = MemoryTable.from_snapshot(reader, prefix, self._cold)
+        memories.lock = self._lock
+        cold = None
+        if self._cold is not None and prefix + "cold.index" in reader.names():
+            cold = self._cold.stage_snapshot(reader, prefix + "cold.")
+        return {"state": state, "memories": memories, "cold": cold}
+    
+    def discard_snapshot(self, staged: Dict[str, Any]):
+        """丢弃 stage_snapshot() 读出的状态"""
+        if staged["cold"] is not None:
+            self._cold.discard_snapshot(staged["cold"])
+    
+    def apply_snapshot(self, staged: Dict[str, Any]):
+        """以 stage_snapshot() 读出的状态替换当前全部记忆"""
+        state, memories = staged["state"], staged["memories"]
+        with self._lock.write():
+            with self._pending_lock:
+                self._pending_access.clear()
+            self._bump_generation()
+            if self._cold is not None:
+                if staged["cold"] is not None:
+                    self._cold.apply_snapshot(staged["cold"])
+                else:
+                    self._cold.clear()
+            self.memories = memories
+            self.memory_count = state["memory_count"]
+            self._last_decay_at = state["last_decay_at"]
+            self.evictions = state["evictions"]
+            self.evicted_bytes = state["evicted_bytes"]
+            self.consolidated = state["consolidated"]
+            
+            self._text_index.clear()
+            self._tag_index.clear()
+            if self._eviction is not None:
+                self._eviction = MemoryEvictionPolicy()
+            # 近重复索引从头登记，已合并过的记忆重新处理时不会再有变化
+            self._dedup_index.clear()
+            self._consolidate_cursor = 0
+            self._indexed_rows = 0
+            self._similarity = None
+    
+    @contextmanager
+    def _read_locked(self, similarity: bool = False) -> Iterator[None]:
+        """持读锁检索
+        
+        索引尚有未登记的记忆时，先在写锁下补齐再重新取读锁；相似度索引每次持写锁只登记
+        SIMILARITY_BATCH 条，首次建立时其他读写可以穿插在批次之间进行。
+        排队等待重新登记到淘汰堆的批次过多时，检索结束后在写锁下顺带处理。
+        """
+        while True:
+            with self._lock.read():
+                if self._indexed_rows == len(self.memories) and (
+                        not similarity or (self._similarity is not None
+                                           and self._similarity_rows == len(self.memories))):
+                    yield
+                    break
+            with self._lock.write():
+                self._ensure_indexes()
+                if similarity:
+                    self._ensure_similarity_index()
+            if similarity:
+                time.sleep(0)  # 让出 CPU，使等待中的读写在下一批之前取得锁
+        
+        if self._retrack.qsize() > self.RETRACK_BATCH:
+            with self._lock.write():
+                self._retrack_pending()
+    
+    def _promote(self, memory_ids: List[str]):
+        """将被访问的冷记忆取回内存并重新登记到内容倒排索引"""
+        with self._lock.write():
+            table = self.memories
+            for memory_id in memory_ids:
+                row = table.row_of(memory_id)
+                if row is None or not table.is_cold(row):
+                    continue
+                content = table.promote(row)
+                if row < self._indexed_rows:
+                    self._text_index.add(row, content.lower())
+                if self._similarity is not None and row < self._similarity_rows:
+                    self._similarity.add(row, content)
+    
+    def _cold_ids(self, rows: Iterable[int]) -> List[str]:
+        """给定行中冷记忆的ID"""
+        if not self._cold:
+            return []
+        table = self.memories
+        return [table.memory_id(row) for row in rows if table.is_cold(row)]
+    
+    def _cold_similar(self, query: str, min_score: float) -> List[Tuple[int, float]]:
+        """冷记忆的相似度：布隆过滤器挑出与查询有共同二元组的段，解压后逐条打分"""
+        text = " ".join(query.lower().split())
+        grams = [text] if len(text) == 1 else [text[i:i + 2] for i in range(len(text) - 1)]
+        entries = self._cold.entries(grams)
+        scores = self._similarity.score(query, [content for _, content in entries])
+        return [(row, score) for (row, _), score in zip(entries, scores) if score > min_score]
+    
+    def _cold_matches(self, query: str, tag_rows: Optional[Set[int]], excluded_rows: Set[int]) -> List[int]:
+        """扫描冷存储，返回内容包含 query 且满足标签条件的冷记忆行"""
+        return [
+            row for row in self._cold.scan(query)
+            if (tag_rows is None or row in tag_rows) and row not in excluded_rows
+        ]
+    
+    def _hot_rows(self, rows: Iterable[int]) -> Iterable[int]:
+        """存在冷记忆时滤掉冷记忆行（它们由冷存储扫描单独处理）"""
+        if not self._cold:
+            return rows
+        cold_segment = self.memories.cold_segment
+        return (row for row in rows if cold_segment[row] < 0)
+    
+    def _ensure_indexes(self):
+        """将尚未登记的记忆整批登记到倒排索引和淘汰堆"""
+        table = self.memories
+        if self._indexed_rows == len(table):
+            return
+        
+        rows = [row for row in range(self._indexed_rows, len(table)) if table.alive[row]]
+        self._text_index.add_many((row, table.content(row).lower()) for row in rows if not table.is_cold(row))
+        self._tag_index.add_many((row, table.tags(row)) for row in rows)
+        if self._eviction is not None:
+            for row in rows:
+                self._eviction.track(table, row)
+        self._indexed_rows = len(table)
+    
+    def _ensure_similarity_index(self):
+        """建立相似度索引并登记至多 SIMILARITY_BATCH 条尚未登记的记忆"""
+        if self._similarity is None:
+            from mjos_similarity import MemorySimilarityIndex
+            self._similarity = MemorySimilarityIndex()
+            self._similarity_rows = 0
+        
+        table = self.memories
+        end = min(len(table), self._similarity_rows + self.SIMILARITY_BATCH)
+        for row in range(self._similarity_rows, end):
+            if table.alive[row] and not table.is_cold(row):
+                self._similarity.add(row, table.content(row))
+        self._similarity_rows = end
+        return self._similarity
+    
+    def _enforce_capacity(self):
+        """淘汰记忆直到满足条数和字节数上限"""
+        table = self.memories
+        evicted = 0
+        
+        while ((self.max_entries and table.live_count > self.max_entries)
+               or (self.max_bytes and table.live_bytes > self.max_bytes)):
+            self._ensure_indexes()
+            self._flush_access()
+            self._retrack_pending()
+            row = self._eviction.pop_victim(table)
+            if row is None:
+                break
+            self.evicted_bytes += table.content_size(row)
+            self._delete_row(row)
+            evicted += 1
+        
+        if evicted:
+            self.evictions += evicted
+            print(f"♻️ 记忆淘汰：移除 {evicted} 条低价值记忆 (累计 {self.evictions} 条)")
+            
+            # 淘汰只做删除标记，垃圾占比过高时压缩回收，内存占用才真正受上限约束
+            ratio = self.EVICTION_COMPACT_RATIO
+            if (len(table) - table.live_count >= ratio * len(table)
+                    or table.pool_bytes - table.live_bytes >= ratio * table.pool_bytes):
+                garbage = self._compact()
+                if garbage:
+                    print(f"🧹 记忆压缩：回收 {garbage} 条已删除记忆")
+    
+    def _merge_into(self, keeper: int, duplicate: int):
+        """将近重复记忆合并到保留的记忆中，并删除重复项"""
+        table = self.memories
+        table.access_count[keeper] += table.access_count[duplicate]
+        table.importance[keeper] = max(table.importance[keeper], table.importance[duplicate])
+        
+        keeper_tags = table.tags(keeper)
+        extra_tags = [tag for tag in table.tags(duplicate) if tag not in keeper_tags]
+        if extra_tags:
+            table.set_tags(keeper, list(keeper_tags) + extra_tags)
+            self._tag_index.add(keeper, extra_tags)
+        
+        self._delete_row(duplicate)
+        if self._eviction is not None:
+            self._eviction.track(table, keeper)
+    
+    def _delete_row(self, row: int):
+        """从索引和记忆表中删除一行"""
+        self._bump_generation()
+        table = self.memories
+        if row < self._indexed_rows:
+            if not table.is_cold(row):
+                self._text_index.remove(row, table.content(row).lower())
+            self._tag_index.remove(row, table.tags(row))
+        self._dedup_index.remove(row)
+        if self._similarity is not None and row < self._similarity_rows:
+            self._similarity.remove(row)
+        table.delete(row)
+    
+    def _bump_generation(self):
+        """记忆内容或排序依据发生变化：写回待处理的访问次数和淘汰堆登记，并使检索缓存失效（须持写锁）"""
+        self._flush_access()
+        self._retrack_pending()
+        self.generation += 1
+    
+    def _add_access(self, rows: List[int], hits: int = 1):
+        """累加访问次数：同一分段的行只加一次锁；淘汰堆的重新登记排队等写者处理"""
+        access_count = self.memories.access_count
+        for lock, stripe_rows in self._access_stripes.partition(rows):
+            with lock:
+                for row in stripe_rows:
+                    access_count[row] += hits
+        
+        if self._eviction is not None and rows:
+            self._retrack.put(rows)
+    
+    def _flush_access(self):
+        """将缓存命中累积的访问次数写回记忆表（持读锁即可）"""
+        with self._pending_lock:
+            if not self._pending_access:
+                return
+            pending, self._pending_access = self._pending_access, {}
+        
+        table = self.memories
+        for matched_rows, hits in pending.values():
+            self._add_access([row for row in matched_rows if table.alive[row]], hits)
+    
+    def _retrack_pending(self):
+        """将排队的行重新登记到淘汰堆（须持写锁）"""
+        rows = set()
+        while True:
+            try:
+                rows.update(self._retrack.get_nowait())
+            except Empty:
+                break
+        
+        if self._eviction is not None:
+            table = self.memories
+            for row in sorted(rows):
+                if row < self._indexed_rows and table.alive[row]:
+                    self._eviction.track(table, row)
+    
+    def _candidate_set(self, query: str, tag_rows: Optional[Set[int]],
+                       excluded_rows: Set[int]) -> Optional[Set[int]]:
+        """按标签条件和内容倒排索引求候选集合；两者都无法过滤时返回 None"""
+        text_rows = self._text_index.candidates(query)
+        
+        if tag_rows is None and text_rows is None:
+            return None
+        if tag_rows is None:
+            return text_rows - excluded_rows
+        if text_rows is None:
+            return tag_rows
+        return tag_rows & text_rows
+    
+    def _candidate_rows(self, query: str, tag_rows: Optional[Set[int]], excluded_rows: Set[int]) -> Iterable[int]:
+        """候选行，按行号升序返回"""
+        candidates = self._candidate_set(query, tag_rows, excluded_rows)
+        if candidates is None:
+            return self._live_rows(excluded_rows)
+        return sorted(candidates)
+    
+    def _live_rows(self, excluded_rows: Set[int]) -> Iterable[int]:
+        """全部存活且未被排除的行"""
+        table = self.memories
+        return (row for row in range(len(table)) if table.alive[row] and row not in excluded_rows)
+    
+    def _top_rows(self, matched_rows: List[int], limit: int) -> List[int]:
+        """从匹配行中取排名前 limit 的行"""
+        if self.scorer is not None:
+            return self.scorer.top_k(self.memories, matched_rows, limit, decayed_at=self._last_decay_at)
+        # 按重要性和访问次数取前 limit 条：有界堆 O(m log k)，同分时先存入的记忆优先
+        return heapq.nlargest(limit, matched_rows, key=self._rank_key)
+    
+    def _rank_key(self, row: int) -> Tuple[float, int, int]:
+        """检索排序键：重要性、访问次数，同分按存入顺序"""
+        return self.memories.importance[row], self.memories.access_count[row], -row
 
 # ============================================================================
 # MJOS任务系统
@@ -225,6 +1533,10 @@ class MJOSTaskSystem:
         self.tasks = []
         self.task_count = 0
         self.collaboration_engine = collaboration_engine
+        
+        # 按ID索引任务、按状态计数；任务状态只经 _set_status() 改变，计数随之维护
+        self._tasks_by_id: Dict[str, MJOSTask] = {}
+        self.status_counts: Dict[TaskStatus, int] = {status: 0 for status in TaskStatus}
     
     async def create_task(self, title: str, description: str, context: Dict[str, Any] = None) -> str:
         """创建智能任务"""
@@ -237,6 +1549,29 @@ class MJOSTaskSystem:
             context
         )
         
+        return self._add_task(title, description, decision)
+    
+    async def create_tasks(self, task_defs: List[Dict[str, str]], context: Dict[str, Any] = None,
+                           max_concurrency: int = 4) -> List[Optional[str]]:
+        """批量创建任务：并发协作分析，按输入顺序分配任务ID"""
+        decisions = await self.collaboration_engine.collaborate_many(
+            [f"分析任务：{task_def['title']} - {task_def['description']}" for task_def in task_defs],
+            [context or {} for _ in task_defs],
+            max_concurrency=max_concurrency
+        )
+        
+        task_ids = []
+        for task_def, decision in zip(task_defs, decisions):
+            if isinstance(decision, Exception):
+                print(f"❌ 任务分析失败：{task_def['title']} ({decision})")
+                task_ids.append(None)
+            else:
+                task_ids.append(self._add_task(task_def["title"], task_def["description"], decision))
+        
+        return task_ids
+    
+    def _add_task(self, title: str, description: str, decision: MJOSDecision) -> str:
+        """基于协作决策登记新任务"""
         # 基于决策确定任务分配
         assigned_to = self._determine_assignment(decision)
         
@@ -252,6 +1587,8 @@ class MJOSTaskSystem:
         )
         
         self.tasks.append(task)
+        self._tasks_by_id[task_id] = task
+        self.status_counts[task.status] += 1
         self.task_count += 1
         
         print(f"📋 任务创建：{title} (分配给: {assigned_to})")
@@ -259,13 +1596,13 @@ class MJOSTaskSystem:
     
     async def execute_task(self, task_id: str) -> bool:
         """执行任务"""
-        task = next((t for t in self.tasks if t.id == task_id), None)
+        task = self._tasks_by_id.get(task_id)
         if not task:
             print(f"❌ 任务 {task_id} 不存在")
             return False
         
         print(f"🚀 开始执行任务：{task.title}")
-        task.status = TaskStatus.IN_PROGRESS
+        self._set_status(task, TaskStatus.IN_PROGRESS)
         
         # 模拟任务执行过程
         for progress in [0.2, 0.5, 0.8, 1.0]:
@@ -273,22 +1610,72 @@ class MJOSTaskSystem:
             task.progress = progress
             print(f"📈 任务进度：{int(progress * 100)}%")
         
-        task.status = TaskStatus.COMPLETED
+        self._set_status(task, TaskStatus.COMPLETED)
         print(f"✅ 任务完成：{task.title}")
         return True
     
+    def snapshot_sections(self) -> Dict[str, bytes]:
+        """导出快照分段：任务列表和任务计数"""
+        state = {
+            "task_count": self.task_count,
+            "tasks": [
+                {
+                    "id": task.id,
+                    "title": task.title,
+                    "description": task.description,
+                    "status": task.status.name,
+                    "assigned_to": task.assigned_to,
+                    "progress": task.progress,
+                    "created_at": task.created_at.isoformat()
+                }
+                for task in self.tasks
+            ]
+        }
+        return {"state": json.dumps(state, ensure_ascii=False).encode('utf-8')}
+    
+    def restore_snapshot(self, reader, prefix: str = ""):
+        """从快照分段恢复任务"""
+        self.apply_snapshot(self.stage_snapshot(reader, prefix))
+    
+    def stage_snapshot(self, reader, prefix: str = "") -> Dict[str, Any]:
+        """读出快照中的任务，不改动现有状态；返回值交给 apply_snapshot() 替换当前任务"""
+        state = reader.json_section(prefix + "state")
+        tasks = [
+            MJOSTask(
+                id=task["id"],
+                title=task["title"],
+                description=task["description"],
+                status=TaskStatus[task["status"]],
+                assigned_to=task["assigned_to"],
+                progress=task["progress"],
+                created_at=datetime.fromisoformat(task["created_at"])
+            )
+            for task in state["tasks"]
+        ]
+        return {"task_count": state["task_count"], "tasks": tasks}
+    
+    def apply_snapshot(self, staged: Dict[str, Any]):
+        """以 stage_snapshot() 读出的任务替换当前任务"""
+        self.task_count = staged["task_count"]
+        self.tasks = staged["tasks"]
+        self._tasks_by_id = {task.id: task for task in self.tasks}
+        self.status_counts = {status: 0 for status in TaskStatus}
+        for task in self.tasks:
+            self.status_counts[task.status] += 1
+    
+    def get_task(self, task_id: str) -> Optional[MJOSTask]:
+        """按ID获取任务，不存在时返回 None"""
+        return self._tasks_by_id.get(task_id)
+    
+    def _set_status(self, task: MJOSTask, status: TaskStatus):
+        """改变任务状态并更新状态计数"""
+        self.status_counts[task.status] -= 1
+        self.status_counts[status] += 1
+        task.status = status
+    
     def _determine_assignment(self, decision: MJOSDecision) -> str:
         """基于MJOS决策确定任务分配"""
-        decision_content = decision.final_decision.lower()
-        
-        if "战略" in decision_content or "架构" in decision_content:
-            return MJOSRole.XIAOZHI.value
-        elif "用户" in decision_content or "体验" in decision_content:
-            return MJOSRole.XIAOMEI.value
-        elif "技术" in decision_content or "代码" in decision_content:
-            return MJOSRole.XIAOMA.value
-        else:
-            return "MJOS团队"
+        return self.collaboration_engine.rule_engine.route("assignment", decision.final_decision)
 
 # ============================================================================
 # MJOS主控制器
@@ -297,9 +1684,38 @@ class MJOSTaskSystem:
 class MJOSController:
     """MJOS主控制器"""
     
-    def __init__(self):
-        self.collaboration_engine = MJOSCollaborationEngine()
-        self.memory_system = MJOSMemorySystem()
+    def __init__(self, decision_cache: Union[MJOSDecisionCache, bool, None] = True, rules_path: Optional[str] = None,
+                 memory_backend: str = "memory", memory_path: Optional[str] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 write_behind: bool = False):
+        # 决策缓存：True 使用默认参数的缓存，也可传入自行配置的缓存实例；None 或 False 关闭缓存，
+        # 每次请求都重新协作
+        if decision_cache is True:
+            decision_cache = MJOSDecisionCache()
+        elif decision_cache is False:
+            decision_cache = None
+        rule_engine = KeywordRuleEngine.from_file(rules_path) if rules_path else KeywordRuleEngine()
+        self.collaboration_engine = MJOSCollaborationEngine(decision_cache=decision_cache, rule_engine=rule_engine)
+        
+        # 记忆后端：memory 为进程内存储，tiered 为冷热分层的进程内存储（冷记忆压缩存放在
+        # memory_path 目录），sqlite 为磁盘持久化存储。
+        # max_entries/max_bytes 为进程内存储的条数和内容字节数上限，超出时淘汰低价值记忆。
+        # write_behind 为真时 sqlite 后端在后台成组写入，吞吐更高，但 remember() 返回时记忆尚未落盘，
+        # 进程崩溃会丢失最近 flush_interval 内存入的记忆；stop() 时等待全部落盘
+        if memory_backend == "memory":
+            self.memory_system = MJOSMemorySystem(max_entries=max_entries, max_bytes=max_bytes,
+                                                  dedup_text=self._request_text)
+        elif memory_backend == "tiered":
+            self.memory_system = MJOSMemorySystem(max_entries=max_entries, max_bytes=max_bytes,
+                                                  cold_dir=memory_path or "storage/cold_memories",
+                                                  dedup_text=self._request_text)
+        elif memory_backend == "sqlite":
+            if max_entries or max_bytes:
+                raise ValueError("sqlite 记忆后端不支持容量上限")
+            from mjos_memory_sqlite import SQLiteMemorySystem
+            self.memory_system = SQLiteMemorySystem(memory_path or "storage/mjos_memory.db", write_behind=write_behind)
+        else:
+            raise ValueError(f"未知的记忆后端: {memory_backend}")
         self.task_system = MJOSTaskSystem(self.collaboration_engine)
         self.version = "2.4.0-MJOS-Demo"
         self.startup_time = datetime.now()
@@ -318,6 +1734,13 @@ class MJOSController:
             tags=["系统", "启动"]
         )
     
+    async def stop(self):
+        """停止MJOS系统：等待后台写入的记忆全部落盘"""
+        if hasattr(self.memory_system, "flush"):
+            await asyncio.to_thread(self.memory_system.flush)
+        
+        print("🛑 MJOS智能协作系统已停止")
+    
     async def process_request(self, request: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """处理用户请求"""
         print(f"\n🎯 处理请求：{request}")
@@ -325,49 +1748,88 @@ class MJOSController:
         try:
             # 使用MJOS协作分析请求
             decision = await self.collaboration_engine.collaborate(request, context)
-            
-            # 记录决策
-            self.memory_system.remember(
-                f"处理请求：{request} -> {decision.final_decision[:100]}...",
-                importance=0.7,
-                tags=["请求", "决策"]
-            )
-            
-            return {
-                "status": "success",
-                "decision": {
-                    "id": decision.decision_id,
-                    "problem": decision.problem,
-                    "final_decision": decision.final_decision,
-                    "confidence": decision.confidence
-                }
-            }
+            return self._record_decision(request, decision)
             
         except Exception as e:
-            error_msg = f"处理请求时发生错误：{str(e)}"
-            print(f"❌ {error_msg}")
-            return {"status": "error", "error": error_msg}
+            return self._request_error(e)
+    
+    async def process_requests(self, requests: List[str], contexts: List[Dict[str, Any]] = None,
+                               max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """批量处理用户请求，结果按输入顺序返回"""
+        print(f"\n🎯 批量处理请求：{len(requests)} 条 (并发上限: {max_concurrency})")
+        
+        decisions = await self.collaboration_engine.collaborate_many(
+            requests, contexts, max_concurrency=max_concurrency
+        )
+        
+        results = []
+        for request, decision in zip(requests, decisions):
+            if isinstance(decision, Exception):
+                results.append(self._request_error(decision))
+            else:
+                results.append(self._record_decision(request, decision))
+        return results
+    
+    async def stream_request(self, request: str, context: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """流式处理用户请求：先逐个产出角色观点，最后产出与 process_request 相同的结果"""
+        print(f"\n🎯 流式处理请求：{request}")
+        
+        try:
+            async for event in self.collaboration_engine.iter_collaborate(request, context):
+                if event["type"] == "decision":
+                    yield {"type": "result", "result": self._record_decision(request, event["decision"])}
+                else:
+                    yield event
+        except Exception as e:
+            yield {"type": "result", "result": self._request_error(e)}
+    
+    @staticmethod
+    def _request_text(content: str) -> str:
+        """请求记录的近重复比较只看请求本身：箭头之后的决策文本由共用模板渲染，
+        不同请求之间也高度相似"""
+        head, arrow, _ = content.partition(" -> ")
+        return head if arrow and head.startswith("处理请求：") else content
+    
+    def _record_decision(self, request: str, decision: MJOSDecision) -> Dict[str, Any]:
+        """记录决策并生成请求响应"""
+        self.memory_system.remember(
+            f"处理请求：{request} -> {decision.final_decision[:100]}...",
+            importance=0.7,
+            tags=["请求", "决策"]
+        )
+        
+        return {
+            "status": "success",
+            "decision": {
+                "id": decision.decision_id,
+                "problem": decision.problem,
+                "final_decision": decision.final_decision,
+                "confidence": decision.confidence
+            }
+        }
+    
+    def _request_error(self, error: Exception) -> Dict[str, Any]:
+        """生成请求错误响应"""
+        error_msg = f"处理请求时发生错误：{str(error)}"
+        print(f"❌ {error_msg}")
+        return {"status": "error", "error": error_msg}
     
     async def create_and_execute_workflow(self, workflow_name: str, tasks: List[Dict[str, str]]):
         """创建并执行工作流"""
         print(f"\n🔄 创建工作流：{workflow_name}")
         print("=" * 60)
         
-        task_ids = []
-        
-        # 创建任务
-        for task_def in tasks:
-            task_id = await self.task_system.create_task(
-                title=task_def["title"],
-                description=task_def["description"]
-            )
-            task_ids.append(task_id)
+        # 创建任务（并发分析，按定义顺序编号）
+        task_ids = await self.task_system.create_tasks(tasks)
         
         print(f"\n🚀 执行工作流：{workflow_name}")
         print("=" * 60)
         
         # 执行任务
         for task_id in task_ids:
+            if task_id is None:
+                print("⚠️ 工作流中断：存在创建失败的任务")
+                break
             success = await self.task_system.execute_task(task_id)
             if not success:
                 print(f"⚠️ 工作流中断：任务 {task_id} 执行失败")
@@ -382,6 +1844,83 @@ class MJOSController:
         
         print(f"\n✅ 工作流完成：{workflow_name}")
     
+    async def optimize_system(self, consolidate: bool = False) -> Dict[str, Any]:
+        """系统优化：衰减记忆重要性并压缩已删除的记忆
+        
+        consolidate 为真时先合并近重复记忆；合并会删除记忆，默认不做。
+        """
+        print("🔧 开始MJOS系统优化...")
+        
+        optimization_results = {}
+        if isinstance(self.memory_system, MJOSMemorySystem):
+            consolidated = await self.memory_system.consolidate_in_background() if consolidate else 0
+            optimization_results["memory_optimization"] = {
+                "consolidated_memories": consolidated,
+                "decayed_memories": self.memory_system.decay_memories(),
+                "compacted_memories": self.memory_system.compact_memories()
+            }
+        
+        print("✅ MJOS系统优化完成")
+        return optimization_results
+    
+    def save_snapshot(self, path: str = "storage/mjos_snapshot.bin") -> str:
+        """将控制器状态（记忆、决策、任务、计数器）保存为二进制快照
+        
+        SQLite 记忆后端本身已持久化，快照中不包含其记忆。
+        """
+        meta = {
+            "version": self.version,
+            "saved_at": datetime.now().isoformat(),
+            "collaboration_count": self.collaboration_engine.collaboration_count
+        }
+        sections = {"meta": json.dumps(meta, ensure_ascii=False).encode('utf-8')}
+        components = [
+            ("decisions.", self.collaboration_engine.decision_history),
+            ("tasks.", self.task_system)
+        ]
+        if isinstance(self.memory_system, MJOSMemorySystem):
+            components.append(("memory.", self.memory_system))
+        for prefix, component in components:
+            for name, data in component.snapshot_sections().items():
+                sections[prefix + name] = data
+        
+        write_snapshot(path, sections)
+        print(f"💾 快照已保存：{path} ({len(self.collaboration_engine.decision_history)} 条决策, "
+              f"{self.task_system.task_count} 个任务)")
+        return path
+    
+    def load_snapshot(self, path: str = "storage/mjos_snapshot.bin"):
+        """从二进制快照恢复控制器状态
+        
+        各列数据整段拷贝，决策只在读取时解码，记忆索引在首次检索时重建。
+        先读出全部组件的新状态，都成功后才一并替换；快照损坏或与当前记忆后端不兼容时
+        在改动任何组件之前抛出。
+        """
+        history = self.collaboration_engine.decision_history
+        with SnapshotReader(path) as reader:
+            meta = reader.json_section("meta")
+            restore_memory = isinstance(self.memory_system, MJOSMemorySystem) and "memory.state" in reader.names()
+            memory = decisions = None
+            try:
+                memory = self.memory_system.stage_snapshot(reader, "memory.") if restore_memory else None
+                decisions = history.stage_snapshot(reader, "decisions.")
+                tasks = self.task_system.stage_snapshot(reader, "tasks.")
+                collaboration_count = meta["collaboration_count"]
+            except BaseException:
+                if memory is not None:
+                    self.memory_system.discard_snapshot(memory)
+                if decisions is not None:
+                    history.discard_snapshot(decisions)
+                raise
+            
+            if memory is not None:
+                self.memory_system.apply_snapshot(memory)
+            history.apply_snapshot(decisions)
+            self.task_system.apply_snapshot(tasks)
+            self.collaboration_engine.collaboration_count = collaboration_count
+        
+        print(f"📦 快照已加载：{path} (保存于 {meta['saved_at']})")
+    
     def get_system_status(self) -> Dict[str, Any]:
         """获取系统状态"""
         return {
@@ -389,8 +1928,11 @@ class MJOSController:
             "uptime": str(datetime.now() - self.startup_time),
             "collaboration_count": self.collaboration_engine.collaboration_count,
             "memory_count": self.memory_system.memory_count,
+            "memory_stats": self.memory_system.stats(),
             "task_count": self.task_system.task_count,
-            "completed_tasks": len([t for t in self.task_system.tasks if t.status == TaskStatus.COMPLETED])
+            "completed_tasks": self.task_system.status_counts[TaskStatus.COMPLETED],
+            "decision_cache": self.collaboration_engine.decision_cache.stats()
+            if self.collaboration_engine.decision_cache is not None else None
         }
 
 # ============================================================================
@@ -453,6 +1995,8 @@ async def main():
     print("   ✅ 智能任务系统（创建、分配、执行、跟踪）")
     print("   ✅ 统一控制接口（请求处理、工作流管理）")
     print("\n🚀 MJOS - 让AI协作更智能，让开发更高效！")
+    
+    await mjos.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
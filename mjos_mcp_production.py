@@ -5,23 +5,39 @@ MJOS-MCP生产部署
 """
 
 import asyncio
+import copy
 import json
 import subprocess
 import sys
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Awaitable, Callable
 from pathlib import Path
 import socket
 
 # 导入我们的MJOS系统
-from mjos_demo import MJOSController
+from mjos_demo import MJOSController, MJOSMemorySystem, decision_cache_key
 
 class MJOSMCPProduction:
     """MJOS-MCP生产部署系统"""
     
-    def __init__(self):
-        self.mjos_controller = MJOSController()
+    # mjos/memory 各操作的必填参数，缺少时返回 -32602
+    MEMORY_REQUIRED_PARAMS = {
+        "remember": ("content",),
+        "remember_many": ("memories",),
+        "recall_many": ("queries",),
+        "get": ("id",),
+        "update": ("id",),
+        "forget": ("id",),
+        "touch": ("id",)
+    }
+    
+    def __init__(self, mjos_controller: Optional[MJOSController] = None,
+                 memory_max_entries: Optional[int] = None, memory_max_bytes: Optional[int] = None):
+        # 可传入自行配置的控制器（决策缓存、记忆后端等），否则按记忆容量上限创建默认控制器
+        if mjos_controller is None:
+            mjos_controller = MJOSController(max_entries=memory_max_entries, max_bytes=memory_max_bytes)
+        self.mjos_controller = mjos_controller
         self.mcp_server_process = None
         self.mcp_server_url = "http://localhost:3000"
         self.is_mcp_connected = False
@@ -31,6 +47,9 @@ class MJOSMCPProduction:
             "services_registered": False,
             "monitoring_active": False
         }
+        # 进行中的协作请求表：相同问题/上下文的并发请求共享同一次协作
+        self._inflight_collaborations: Dict[str, asyncio.Task] = {}
+        self.coalesced_requests = 0
         
     async def deploy_production_system(self):
         """部署生产系统"""
@@ -348,6 +367,7 @@ process.on('SIGTERM', () => {
         # 启动监控任务
         asyncio.create_task(self._production_health_monitor())
         asyncio.create_task(self._production_performance_monitor())
+        asyncio.create_task(self._memory_compaction_monitor())
         
         self.deployment_status["monitoring_active"] = True
         print("  ✅ 生产监控已启动")
@@ -401,8 +421,30 @@ process.on('SIGTERM', () => {
                 print(f"❌ 性能监控异常: {e}")
                 await asyncio.sleep(300)
     
-    async def process_mcp_request(self, mcp_request: Dict[str, Any]) -> Dict[str, Any]:
-        """处理MCP协议请求"""
+    async def _memory_compaction_monitor(self):
+        """后台压缩已删除的记忆，并将陈旧记忆转入冷存储（启用分层时）"""
+        while True:
+            try:
+                memory_system = self.mjos_controller.memory_system
+                if isinstance(memory_system, MJOSMemorySystem):
+                    # 已删除记忆占比超过四分之一时才压缩；压缩持写锁整表重排，放到线程中执行，
+                    # 不阻塞事件循环上的其他请求
+                    await asyncio.to_thread(memory_system.compact_memories, min_garbage_ratio=0.25)
+                    await asyncio.to_thread(memory_system.demote_memories)
+                
+                await asyncio.sleep(60)  # 每分钟检查一次
+                
+            except Exception as e:
+                print(f"❌ 记忆压缩异常: {e}")
+                await asyncio.sleep(60)
+    
+    async def process_mcp_request(self, mcp_request: Dict[str, Any],
+                                  notify: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """处理MCP协议请求
+        
+        传入 notify 且请求参数 stream 为真时，协作请求的各角色观点会以
+        mjos/collaborate/progress 通知逐条推送，最终结果仍作为响应返回。
+        """
         try:
             method = mcp_request.get('method', 'unknown')
             params = mcp_request.get('params', {})
@@ -410,9 +452,40 @@ process.on('SIGTERM', () => {
             
             print(f"📨 处理MCP请求: {method}")
             
-            if method == 'mjos/collaborate':
+            if method == 'mjos/collaborate' and params.get('stream') and notify is not None:
+                # 流式协作：每个角色完成即推送通知
+                result = None
+                async for event in self.mjos_controller.stream_request(
+                    params.get('problem', ''),
+                    params.get('context', {})
+                ):
+                    if event["type"] == "result":
+                        result = event["result"]
+                    else:
+                        await notify({
+                            "jsonrpc": "2.0",
+                            "method": "mjos/collaborate/progress",
+                            "params": {
+                                "request_id": request_id,
+                                "role": event["role"],
+                                "perspective": event["perspective"],
+                                "elapsed": event["elapsed"]
+                            }
+                        })
+                
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": {
+                        "success": result["status"] == "success",
+                        "data": result,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                }
+            
+            elif method == 'mjos/collaborate':
                 # 处理协作请求
-                result = await self.mjos_controller.process_request(
+                result = await self._collaborate_coalesced(
                     params.get('problem', ''),
                     params.get('context', {})
                 )
@@ -430,20 +503,94 @@ process.on('SIGTERM', () => {
             elif method == 'mjos/memory':
                 # 处理记忆请求
                 action = params.get('action', 'recall')
-                if action == 'recall':
-                    memories = self.mjos_controller.memory_system.recall(
+                memory_system = self.mjos_controller.memory_system
+                missing = [name for name in self.MEMORY_REQUIRED_PARAMS.get(action, ()) if name not in params]
+                if missing:
+                    return self._invalid_params(request_id, f"Missing required parameter for {action}: {missing[0]}")
+                if action == 'recall' and params.get('mode') == 'similar':
+                    # 相似度检索：不要求子串完全匹配；首次检索要建立索引，放到线程中执行以免阻塞事件循环
+                    if not hasattr(memory_system, 'recall_similar'):
+                        return self._invalid_params(request_id, "Similarity recall is not supported by this memory backend")
+                    memories = await asyncio.to_thread(
+                        memory_system.recall_similar,
                         params.get('query', ''),
                         limit=params.get('limit', 5)
                     )
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "success": True,
-                            "memories": [{"content": m.content, "importance": m.importance} for m in memories],
-                            "count": len(memories)
-                        }
+                    result = {
+                        "success": True,
+                        "memories": [
+                            {"id": m["id"], "content": m["content"], "importance": m["importance"]}
+                            for m in memories
+                        ],
+                        "count": len(memories)
+                    }
+                elif action == 'recall':
+                    filters = {key: params[key] for key in ('tags_all', 'tags_any', 'exclude') if key in params}
+                    memories = memory_system.recall(
+                        params.get('query', ''),
+                        limit=params.get('limit', 5),
+                        **filters
+                    )
+                    result = {
+                        "success": True,
+                        "memories": [
+                            {"id": m["id"], "content": m["content"], "importance": m["importance"]}
+                            for m in memories
+                        ],
+                        "count": len(memories)
+                    }
+                elif action == 'remember':
+                    memory_id = memory_system.remember(
+                        params['content'],
+                        importance=params.get('importance', 0.5),
+                        tags=params.get('tags')
+                    )
+                    result = {"success": True, "id": memory_id}
+                elif action == 'remember_many':
+                    memory_ids = memory_system.remember_many(params['memories'])
+                    result = {"success": True, "ids": memory_ids, "count": len(memory_ids)}
+                elif action == 'recall_many':
+                    filters = {key: params[key] for key in ('tags_all', 'tags_any', 'exclude') if key in params}
+                    batches = memory_system.recall_many(
+                        params['queries'],
+                        limit=params.get('limit', 5),
+                        **filters
+                    )
+                    result = {
+                        "success": True,
+                        "results": [
+                            [{"id": m["id"], "content": m["content"], "importance": m["importance"]} for m in memories]
+                            for memories in batches
+                        ]
+                    }
+                elif action == 'get':
+                    memory = memory_system.get(params['id'])
+                    result = {
+                        "success": memory is not None,
+                        "memory": {
+                            "id": memory["id"],
+                            "content": memory["content"],
+                            "importance": memory["importance"],
+                            "tags": memory["tags"],
+                            "created_at": memory["created_at"].isoformat(),
+                            "access_count": memory["access_count"]
+                        } if memory is not None else None
                     }
+                elif action == 'update':
+                    fields = {key: params[key] for key in ('content', 'importance', 'tags') if key in params}
+                    result = {"success": memory_system.update(params['id'], **fields), "id": params['id']}
+                elif action == 'forget':
+                    result = {"success": memory_system.forget(params['id']), "id": params['id']}
+                elif action == 'touch':
+                    result = {"success": memory_system.touch(params['id']), "id": params['id']}
+                else:
+                    return self._invalid_params(request_id, f"Unknown memory action: {action}")
+                
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": result
+                }
             
             else:
                 return {
@@ -465,11 +612,42 @@ process.on('SIGTERM', () => {
                 }
             }
     
+    @staticmethod
+    def _invalid_params(request_id: Any, message: str) -> Dict[str, Any]:
+        """参数错误响应（JSON-RPC -32602）"""
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": -32602,
+                "message": message
+            }
+        }
+    
+    async def _collaborate_coalesced(self, problem: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """合并并发的相同协作请求，只执行一次协作"""
+        key = decision_cache_key(problem, context)
+        inflight = self._inflight_collaborations.get(key)
+        
+        if inflight is None:
+            inflight = asyncio.ensure_future(self.mjos_controller.process_request(problem, context))
+            self._inflight_collaborations[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight_collaborations.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+            print(f"🔗 合并进行中的协作请求: {problem[:50]}")
+        
+        # shield: 单个调用方被取消时不影响其他等待者；结果深拷贝，调用方之间不共享嵌套的决策字典
+        result = await asyncio.shield(inflight)
+        return copy.deepcopy(result)
+    
     def get_deployment_status(self) -> Dict[str, Any]:
         """获取部署状态"""
         return {
             "deployment_status": self.deployment_status,
             "mcp_connected": self.is_mcp_connected,
+            "inflight_collaborations": len(self._inflight_collaborations),
+            "coalesced_requests": self.coalesced_requests,
             "mjos_status": self.mjos_controller.get_system_status() if self.deployment_status["python_mjos"] else None,
             "timestamp": datetime.now().isoformat()
         }
@@ -478,6 +656,9 @@ process.on('SIGTERM', () => {
         """关闭生产系统"""
         print("🛑 关闭MJOS-MCP生产系统...")
         
+        # 等待后台写入的记忆落盘
+        await self.mjos_controller.stop()
+        
         # 关闭MCP服务器
         if self.mcp_server_process:
             self.mcp_server_process.terminate()
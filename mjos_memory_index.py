@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+MJOS记忆索引
+为记忆系统提供倒排索引，检索时先求候选集合，再对少量候选做精确校验
+"""
+
+import random
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+class NGramIndex:
+    """字符 n-gram 倒排索引（单字 + 双字），适用于中文等无分词文本
+
+    索引建立在小写文本上，candidates() 返回的候选集合是子串匹配结果的超集，
+    调用方仍需用 `query in text` 做最终校验。
+    """
+
+    def __init__(self):
+        self._unigrams: Dict[str, Set[int]] = {}
+        self._bigrams: Dict[str, Set[int]] = {}
+
+    def add(self, row: int, text: str):
+        """登记一条记录（text 应为已转小写的内容）"""
+        for gram in self._grams(text, 1):
+            self._unigrams.setdefault(gram, set()).add(row)
+        for gram in self._grams(text, 2):
+            self._bigrams.setdefault(gram, set()).add(row)
+
+    def add_many(self, entries: Iterable[Tuple[int, str]]):
+        """批量登记 (行号, 小写文本)：先按 n-gram 归并整批行号，再合入倒排表"""
+        entries = list(entries)
+        for postings, size in ((self._unigrams, 1), (self._bigrams, 2)):
+            pending: Dict[str, List[int]] = {}
+            for row, text in entries:
+                for gram in self._grams(text, size):
+                    rows = pending.get(gram)
+                    if rows is None:
+                        pending[gram] = [row]
+                    else:
+                        rows.append(row)
+            self._merge(postings, pending)
+
+    def remove(self, row: int, text: str):
+        """移除一条记录（text 须与登记时相同）"""
+        for postings, size in ((self._unigrams, 1), (self._bigrams, 2)):
+            for gram in self._grams(text, size):
+                rows = postings.get(gram)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del postings[gram]
+
+    def candidates(self, query: str) -> Optional[Set[int]]:
+        """返回可能包含 query 的记录集合；空查询无法过滤，返回 None"""
+        if not query:
+            return None
+
+        if len(query) == 1:
+            return set(self._unigrams.get(query, ()))
+
+        postings = []
+        for gram in self._grams(query, 2):
+            rows = self._bigrams.get(gram)
+            if not rows:
+                return set()
+            postings.append(rows)
+
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        result = set(postings[0])
+        for rows in postings[1:]:
+            result &= rows
+            if not result:
+                break
+        return result
+
+    def remap(self, mapping: Dict[int, int]):
+        """记忆表压缩后按 旧行号 -> 新行号 重写倒排表"""
+        for postings in (self._unigrams, self._bigrams):
+            for gram, rows in postings.items():
+                postings[gram] = {mapping[row] for row in rows if row in mapping}
+
+    def clear(self):
+        """清空索引"""
+        self._unigrams.clear()
+        self._bigrams.clear()
+
+    @staticmethod
+    def _merge(postings: Dict[str, Set[int]], pending: Dict[str, List[int]]):
+        """将按批归并的行号合入倒排表"""
+        for gram, rows in pending.items():
+            existing = postings.get(gram)
+            if existing is None:
+                postings[gram] = set(rows)
+            else:
+                existing.update(rows)
+
+    @staticmethod
+    def _grams(text: str, size: int) -> Iterable[str]:
+        """文本中不重复的 n-gram"""
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class TagIndex:
+    """标签倒排索引：标签 -> 记录行号集合"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+
+    def add(self, row: int, tags: Iterable[str]):
+        """登记一条记录的标签"""
+        for tag in tags:
+            self._postings.setdefault(tag, set()).add(row)
+
+    def add_many(self, entries: Iterable[Tuple[int, Iterable[str]]]):
+        """批量登记 (行号, 标签)"""
+        for row, tags in entries:
+            for tag in tags:
+                rows = self._postings.get(tag)
+                if rows is None:
+                    self._postings[tag] = {row}
+                else:
+                    rows.add(row)
+
+    def remove(self, row: int, tags: Iterable[str]):
+        """移除一条记录的标签"""
+        for tag in tags:
+            rows = self._postings.get(tag)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._postings[tag]
+
+    def rows(self, tag: str) -> Set[int]:
+        """带有某个标签的记录（只读）"""
+        return self._postings.get(tag, set())
+
+    def select(self, tags_all: List[str] = None, tags_any: List[str] = None,
+               exclude: List[str] = None) -> Tuple[Optional[Set[int]], Set[int]]:
+        """按布尔标签条件求记录集合
+
+        返回 (包含集合, 排除集合)；未指定 tags_all/tags_any 时包含集合为 None，表示不限制。
+        """
+        included = None
+
+        if tags_all:
+            # 从最短的倒排表开始求交集
+            postings = sorted((self.rows(tag) for tag in tags_all), key=len)
+            included = set(postings[0])
+            for rows in postings[1:]:
+                included &= rows
+                if not included:
+                    break
+
+        if tags_any:
+            any_rows = set()
+            for tag in tags_any:
+                any_rows |= self.rows(tag)
+            included = any_rows if included is None else included & any_rows
+
+        excluded = set()
+        for tag in exclude or ():
+            excluded |= self.rows(tag)
+
+        if included is not None:
+            included -= excluded
+        return included, excluded
+
+    def remap(self, mapping: Dict[int, int]):
+        """记忆表压缩后按 旧行号 -> 新行号 重写倒排表"""
+        for tag, rows in self._postings.items():
+            self._postings[tag] = {mapping[row] for row in rows if row in mapping}
+
+    def clear(self):
+        """清空索引"""
+        self._postings.clear()
+
+class MinHashLSH:
+    """MinHash + LSH 近重复检测
+
+    以字符 shingle 集合的 MinHash 签名估计 Jaccard 相似度，签名按 band 分桶，
+    只有至少一个 band 完全相同的记录才会成为候选，避免两两比较。
+    """
+
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 32, bands: int = 8, shingle_size: int = 3,
+                 threshold: float = 0.8, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须是 bands 的整数倍")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(num_perm)
+        ]
+        self._buckets: List[Dict[Tuple[int, ...], Set[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, Tuple[int, ...]] = {}
+
+    def shingles(self, text: str) -> Set[str]:
+        """文本的字符 shingle 集合"""
+        size = self.shingle_size
+        return {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """计算文本的 MinHash 签名"""
+        shingles = self.shingles(text)
+        hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+        prime = self._PRIME
+        return tuple(
+            min((a * h + b) % prime for h in hashes) for a, b in self._permutations
+        )
+
+    def add(self, row: int, signature: Tuple[int, ...]):
+        """登记一条记录的签名"""
+        self._signatures[row] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(row)
+
+    def remove(self, row: int):
+        """移除一条记录"""
+        signature = self._signatures.pop(row, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            rows = self._buckets[band].get(key)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._buckets[band][key]
+
+    def find_duplicate(self, signature: Tuple[int, ...],
+                       verify: Optional[Callable[[int], bool]] = None) -> Optional[int]:
+        """返回估计相似度不低于阈值的已登记记录（取行号最小者），没有则返回 None
+
+        给出 verify 时，候选还须通过 verify(row) 的精确校验，排除估计误差造成的误判
+        """
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates |= self._buckets[band].get(key, set())
+
+        for row in sorted(candidates):
+            if self.similarity(signature, self._signatures[row]) >= self.threshold:
+                if verify is None or verify(row):
+                    return row
+        return None
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """由签名估计 Jaccard 相似度"""
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+    @staticmethod
+    def jaccard(first: Set[str], second: Set[str]) -> float:
+        """两个 shingle 集合的精确 Jaccard 相似度"""
+        if not first and not second:
+            return 1.0
+        return len(first & second) / len(first | second)
+
+    def remap(self, mapping: Dict[int, int]):
+        """记忆表压缩后按 旧行号 -> 新行号 重新登记签名"""
+        signatures = self._signatures
+        self.clear()
+        for row, signature in signatures.items():
+            if row in mapping:
+                self.add(mapping[row], signature)
+
+    def clear(self):
+        """清空索引"""
+        for buckets in self._buckets:
+            buckets.clear()
+        self._signatures = {}
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> Iterable[Tuple[int, ...]]:
+        """签名切分后的各 band"""
+        step = self.rows_per_band
+        return (signature[i:i + step] for i in range(0, self.num_perm, step))
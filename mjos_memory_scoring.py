@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+MJOS记忆评分
+按 importance × decay(age) × f(access_count) 为候选记忆打分，
+并支持对整个记忆表批量衰减重要性；NumPy 可用时整列向量化计算
+"""
+
+import heapq
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 NumPy 时退回逐条计算
+    np = None
+
+from mjos_memory_table import MemoryTable
+
+@dataclass
+class MemoryScorer:
+    """MJOS记忆评分器
+
+    score = importance ** importance_weight
+            × 0.5 ** (age / half_life)
+            × (1 + access_weight × ln(1 + access_count))
+
+    decay() 把截至 decayed_at 的时间衰减写入重要性，打分时 age 只计 decayed_at
+    （或之后存入的记忆的存入时间）之后经过的时间，同一段时间不会被衰减两次
+    """
+    half_life: float = 7 * 24 * 3600.0  # 记忆新鲜度半衰期（秒）
+    importance_weight: float = 1.0
+    access_weight: float = 0.1
+    min_importance: float = 0.01  # 批量衰减时的重要性下限
+
+    def scores(self, table: MemoryTable, rows: Sequence[int], now: Optional[float] = None,
+               decayed_at: float = 0.0) -> List[float]:
+        """计算指定行的得分"""
+        if now is None:
+            now = time.time()
+        if not rows:
+            return []
+
+        if np is not None:
+            return self._scores_vectorized(table, rows, now, decayed_at).tolist()
+
+        return [
+            self._score(table.importance[row], table.access_count[row],
+                        now - max(table.created_at[row], decayed_at))
+            for row in rows
+        ]
+
+    def top_k(self, table: MemoryTable, rows: Sequence[int], limit: int, now: Optional[float] = None,
+              decayed_at: float = 0.0) -> List[int]:
+        """按得分取前 limit 行，同分时行号小（先存入）的优先"""
+        if now is None:
+            now = time.time()
+        if limit <= 0 or not rows:
+            return []
+
+        if np is None:
+            scored = [(-score, row) for score, row in zip(self.scores(table, rows, now, decayed_at), rows)]
+            return [row for _, row in sorted(scored)[:limit]]
+
+        row_array = np.asarray(rows, dtype=np.int64)
+        scores = self._scores_vectorized(table, row_array, now, decayed_at)
+
+        if limit < len(row_array):
+            # 先用 argpartition 选出前 limit 个，再对这一小部分排序
+            keep = np.argpartition(-scores, limit - 1)[:limit]
+            # 与第 limit 名同分的行也纳入比较，保证同分时按行号确定
+            threshold = scores[keep].min()
+            keep = np.flatnonzero(scores >= threshold)
+            row_array, scores = row_array[keep], scores[keep]
+
+        order = np.lexsort((row_array, -scores))[:limit]
+        return row_array[order].tolist()
+
+    def decay(self, table: MemoryTable, decayed_at: float, now: float) -> int:
+        """把 decayed_at 到 now 之间的时间衰减写入整表的重要性，返回被衰减的记忆数
+
+        之后存入的记忆只衰减存入以来的时间
+        """
+        if now <= decayed_at or len(table) == 0:
+            return 0
+
+        if np is not None:
+            importance = np.frombuffer(table.importance, dtype=np.float64)
+            created_at = np.frombuffer(table.created_at, dtype=np.float64)
+            decayable = importance > self.min_importance
+            elapsed = np.maximum(now - np.maximum(created_at[decayable], decayed_at), 0.0)
+            importance[decayable] = np.maximum(importance[decayable] * np.exp2(-elapsed / self.half_life),
+                                               self.min_importance)
+            decayed = int(decayable.sum())
+            del importance, created_at  # 释放缓冲区引用，之后记忆表才能继续追加
+            return decayed
+
+        decayed = 0
+        for row in range(len(table)):
+            if table.importance[row] > self.min_importance:
+                elapsed = max(now - max(table.created_at[row], decayed_at), 0.0)
+                table.importance[row] = max(table.importance[row] * 0.5 ** (elapsed / self.half_life),
+                                            self.min_importance)
+                decayed += 1
+        return decayed
+
+    def _score(self, importance: float, access_count: int, age: float) -> float:
+        """单条记忆得分"""
+        return (
+            importance ** self.importance_weight
+            * 0.5 ** (max(age, 0.0) / self.half_life)
+            * (1.0 + self.access_weight * math.log1p(access_count))
+        )
+
+    def _scores_vectorized(self, table: MemoryTable, rows, now: float, decayed_at: float):
+        """对指定行整列计算得分"""
+        importance = np.frombuffer(table.importance, dtype=np.float64)[rows]
+        access_count = np.frombuffer(table.access_count, dtype=np.int64)[rows]
+        created_at = np.frombuffer(table.created_at, dtype=np.float64)[rows]
+
+        age = np.maximum(now - np.maximum(created_at, decayed_at), 0.0)
+        return (
+            importance ** self.importance_weight
+            * np.exp2(-age / self.half_life)
+            * (1.0 + self.access_weight * np.log1p(access_count))
+        )
+
+class MemoryEvictionPolicy:
+    """MJOS记忆容量淘汰策略（GreedyDual 式 LFU/LRU 混合）
+
+    priority = L + importance × (1 + ln(1 + access_count))
+
+    L 为膨胀基准，取最近一次被淘汰记忆的优先级。记忆被存入或访问时按当前 L 重新计算
+    优先级，长期未访问的记忆停留在较早的 L 上而先被淘汰；重要性和访问次数越高越不易淘汰。
+    优先级保存在最小堆中，过期的堆条目在弹出时跳过，选出淘汰对象的均摊代价为 O(log n)。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._priority = array('d')  # 每行当前有效的优先级
+        self._inflation = 0.0
+
+    def track(self, table: MemoryTable, row: int):
+        """登记新存入的记忆，或在记忆被访问后刷新其优先级"""
+        priority = self._inflation + table.importance[row] * (1.0 + math.log1p(table.access_count[row]))
+        while len(self._priority) <= row:
+            self._priority.append(0.0)
+        self._priority[row] = priority
+        heapq.heappush(self._heap, (priority, row))
+
+        # 过期条目过多时重建堆，保证堆大小与存活记忆数同阶
+        if len(self._heap) > 2 * table.live_count + 64:
+            self.rebuild(table)
+
+    def pop_victim(self, table: MemoryTable) -> Optional[int]:
+        """弹出优先级最低的存活记忆；同优先级时先存入的先淘汰"""
+        while self._heap:
+            priority, row = heapq.heappop(self._heap)
+            if table.alive[row] and priority == self._priority[row]:
+                self._inflation = priority
+                return row
+        return None
+
+    def remap(self, table: MemoryTable, kept: Sequence[int]):
+        """记忆表压缩后按保留行（下标为新行号）迁移优先级并重建堆"""
+        priority = self._priority
+        self._priority = array('d', (priority[row] if row < len(priority) else 0.0 for row in kept))
+        self.rebuild(table)
+
+    def rebuild(self, table: MemoryTable):
+        """按当前优先级重建堆"""
+        self._heap = [(self._priority[row], row) for row in range(len(self._priority)) if table.alive[row]]
+        heapq.heapify(self._heap)
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+MJOS SQLite记忆存储
+基于标准库 sqlite3 的持久化记忆后端，接口与 MJOSMemorySystem 相同：
+FTS5 trigram 索引支持任意子串检索（含中文），检索在小写化的内容副本上进行，大小写语义与
+内存后端的 str.lower() 一致；标签展开到 memory_tags 表，检索时按布尔标签条件过滤；
+WAL 模式下读写互不阻塞；
+可选的后台写入（write-behind）模式下，存储记忆只进入内存队列，由后台线程成组提交
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Tuple, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    search_text TEXT NOT NULL,
+    importance REAL NOT NULL,
+    tags TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    access_count INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+    search_text, content='memories', content_rowid='row', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+    INSERT INTO memories_fts(rowid, search_text) VALUES (new.row, new.search_text);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+    INSERT INTO memories_fts(memories_fts, rowid, search_text) VALUES ('delete', old.row, old.search_text);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE OF search_text ON memories BEGIN
+    INSERT INTO memories_fts(memories_fts, rowid, search_text) VALUES ('delete', old.row, old.search_text);
+    INSERT INTO memories_fts(rowid, search_text) VALUES (new.row, new.search_text);
+END;
+CREATE TABLE IF NOT EXISTS memory_tags (
+    tag TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (tag, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS memory_tags_row ON memory_tags(row);
+CREATE TRIGGER IF NOT EXISTS memory_tags_ai AFTER INSERT ON memories BEGIN
+    INSERT OR IGNORE INTO memory_tags(tag, row) SELECT value, new.row FROM json_each(new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS memory_tags_ad AFTER DELETE ON memories BEGIN
+    DELETE FROM memory_tags WHERE row = old.row;
+END;
+CREATE TRIGGER IF NOT EXISTS memory_tags_au AFTER UPDATE OF tags ON memories BEGIN
+    DELETE FROM memory_tags WHERE row = old.row;
+    INSERT OR IGNORE INTO memory_tags(tag, row) SELECT value, new.row FROM json_each(new.tags);
+END;
+CREATE TABLE IF NOT EXISTS memory_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO memory_meta(key, value) VALUES ('next_row', 0);
+CREATE TRIGGER IF NOT EXISTS memory_meta_ai AFTER INSERT ON memories BEGIN
+    UPDATE memory_meta SET value = MAX(value, new.row + 1) WHERE key = 'next_row';
+END;
+"""
+
+# 表结构版本（PRAGMA user_version），旧版本的数据库在打开时升级
+_SCHEMA_VERSION = 3
+_TRIGGERS = (
+    "memories_ai", "memories_ad", "memories_au", "memory_tags_ai", "memory_tags_ad", "memory_tags_au",
+    "memory_meta_ai"
+)
+
+# 语句文本保持不变，由 sqlite3 的语句缓存复用预编译结果
+_INSERT_SQL = (
+    "INSERT INTO memories (row, id, content, search_text, importance, tags, created_at, access_count) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# SQLite 的 LIKE 只对 ASCII 字母忽略大小写，因此匹配 Python 小写化后的 search_text 列
+_MATCH_SQL = "SELECT rowid FROM memories_fts WHERE search_text LIKE ? ESCAPE '\\'"
+# {filters} 为标签过滤条件，语句文本只随标签个数变化
+_TOUCH_MATCHES_SQL = f"UPDATE memories SET access_count = access_count + 1 WHERE row IN ({_MATCH_SQL}){{filters}}"
+_TOP_MATCHES_SQL = (
+    "SELECT id, content, importance, tags, created_at, access_count FROM memories "
+    f"WHERE row IN ({_MATCH_SQL}){{filters}} "
+    "ORDER BY importance DESC, access_count DESC, row ASC LIMIT ?"
+)
+_SELECT_BY_ID_SQL = "SELECT id, content, importance, tags, created_at, access_count FROM memories WHERE id = ?"
+
+class SQLiteMemorySystem:
+    """MJOS SQLite持久化记忆系统
+
+    write_behind 为真时，remember()/remember_many() 只分配ID并将记录放入内存队列，
+    后台线程在队列达到 batch_size 条或最早的记录等待超过 flush_interval 秒时成组提交；
+    其余读写操作先提交队列中的记录，因此总能读到此前存入的记忆。flush() 等待全部落盘。
+    后台提交失败时记录留在队列中重试，错误在下一次 flush() 或读写操作时抛给调用方。
+    """
+
+    def __init__(self, db_path: str = "storage/mjos_memory.db", write_behind: bool = False,
+                 batch_size: int = 256, flush_interval: float = 0.05):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()  # 保护数据库连接
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._open_schema()
+
+        # 启动时只读取持久化的行号上界，不加载记忆内容；删除最后几条记忆后重启也不会重新分配它们的ID
+        self.memory_count = self._conn.execute("SELECT value FROM memory_meta WHERE key = 'next_row'").fetchone()[0]
+
+        # 后台写入队列：记录按分配的行号顺序排队，队列锁不涉及磁盘 I/O
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple] = []
+        self._queue = threading.Condition(threading.Lock())
+        self._closing = False
+        self._writer_error: Optional[BaseException] = None  # 后台提交失败的错误，交给下一个调用方
+        self.batches_written = 0
+        self.records_written = 0
+        self._writer = None
+        if write_behind:
+            self._writer = threading.Thread(target=self._write_behind_loop, name="mjos-memory-writer", daemon=True)
+            self._writer.start()
+
+    def remember(self, content: str, importance: float = 0.5, tags: List[str] = None) -> str:
+        """存储记忆"""
+        if tags is None:
+            tags = []
+
+        if self.write_behind:
+            with self._queue:
+                row = self.memory_count
+                memory_id = f"mem_{row:04d}"
+                self._enqueue([(
+                    row, memory_id, content, content.lower(), importance,
+                    json.dumps(tags, ensure_ascii=False), datetime.now().isoformat(), 1
+                )])
+
+            print(f"🧠 记忆存储：{content[:50]}... (重要性: {importance})")
+            return memory_id
+
+        with self._lock:
+            row = self.memory_count
+            memory_id = f"mem_{row:04d}"
+            self._conn.execute(_INSERT_SQL, (
+                row, memory_id, content, content.lower(), importance,
+                json.dumps(tags, ensure_ascii=False), datetime.now().isoformat(), 1
+            ))
+            self.memory_count += 1
+
+        print(f"🧠 记忆存储：{content[:50]}... (重要性: {importance})")
+        return memory_id
+
+    def remember_many(self, items: Iterable[Union[str, Dict[str, Any]]]) -> List[str]:
+        """批量存储记忆（单个事务内 executemany），返回记忆ID列表
+
+        条目为内容字符串，或含 content、importance、tags 的字典。
+        """
+        created_at = datetime.now().isoformat()
+
+        if self.write_behind:
+            with self._queue:
+                records = self._records(items, created_at)
+                self._enqueue(records)
+
+            print(f"🧠 批量记忆存储：{len(records)} 条记忆")
+            return [record[1] for record in records]
+
+        with self._lock:
+            records = self._records(items, created_at)
+            self._insert(records)
+            self.memory_count += len(records)
+
+        print(f"🧠 批量记忆存储：{len(records)} 条记忆")
+        return [record[1] for record in records]
+
+    def recall(self, query: str, limit: int = 5, tags_all: List[str] = None,
+               tags_any: List[str] = None, exclude: List[str] = None) -> List[Dict[str, Any]]:
+        """检索记忆
+
+        可按标签过滤：tags_all 须全部带有，tags_any 至少带有一个，exclude 均不能带有。
+        """
+        with self._lock:
+            self._write_pending()
+            rows = self._recall_rows([query], limit, tags_all, tags_any, exclude)[0]
+
+        result = [self._row_to_memory(row) for row in rows]
+        print(f"🔍 记忆检索：找到 {len(result)} 条相关记忆")
+
+        return result
+
+    def recall_many(self, queries: List[str], limit: int = 5, tags_all: List[str] = None,
+                    tags_any: List[str] = None, exclude: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """批量检索记忆（共用一个事务），按查询顺序返回各自的结果"""
+        with self._lock:
+            self._write_pending()
+            batches = self._recall_rows(queries, limit, tags_all, tags_any, exclude)
+
+        results = [[self._row_to_memory(row) for row in rows] for rows in batches]
+        print(f"🔍 批量记忆检索：{len(queries)} 个查询，共找到 {sum(map(len, results))} 条相关记忆")
+
+        return results
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取记忆，不存在时返回 None（不计入访问次数）"""
+        with self._lock:
+            self._write_pending()
+            row = self._conn.execute(_SELECT_BY_ID_SQL, (memory_id,)).fetchone()
+        return self._row_to_memory(row) if row is not None else None
+
+    def touch(self, memory_id: str) -> bool:
+        """记录一次对记忆的访问"""
+        with self._lock:
+            self._write_pending()
+            cursor = self._conn.execute(
+                "UPDATE memories SET access_count = access_count + 1 WHERE id = ?", (memory_id,)
+            )
+        return cursor.rowcount > 0
+
+    def update(self, memory_id: str, content: Optional[str] = None, importance: Optional[float] = None,
+               tags: Optional[List[str]] = None) -> bool:
+        """修改记忆的内容、重要性或标签，未指定的字段保持不变"""
+        assignments = []
+        values = []
+        if content is not None:
+            assignments.append("content = ?, search_text = ?")
+            values.extend((content, content.lower()))
+        if importance is not None:
+            assignments.append("importance = ?")
+            values.append(importance)
+        if tags is not None:
+            assignments.append("tags = ?")
+            values.append(json.dumps(tags, ensure_ascii=False))
+
+        if not assignments:
+            return self.get(memory_id) is not None
+
+        with self._lock:
+            self._write_pending()
+            cursor = self._conn.execute(
+                f"UPDATE memories SET {', '.join(assignments)} WHERE id = ?", (*values, memory_id)
+            )
+        if cursor.rowcount == 0:
+            return False
+
+        print(f"✏️ 记忆更新：{memory_id}")
+        return True
+
+    def forget(self, memory_id: str) -> bool:
+        """删除记忆（全文索引由触发器同步）"""
+        with self._lock:
+            self._write_pending()
+            cursor = self._conn.execute("DELETE FROM memories WHERE id = ?", (memory_id,))
+        if cursor.rowcount == 0:
+            return False
+
+        print(f"🗑️ 记忆删除：{memory_id}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """记忆系统统计"""
+        with self._lock:
+            self._write_pending()
+            live, content_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM memories"
+            ).fetchone()
+        stats = {
+            "total_memories": self.memory_count,
+            "live_memories": live,
+            "content_bytes": content_bytes
+        }
+        if self.write_behind:
+            stats["write_behind"] = {
+                "batches_written": self.batches_written,
+                "records_written": self.records_written
+            }
+        return stats
+
+    def flush(self):
+        """等待此前存入的记忆全部提交到数据库"""
+        with self._lock:
+            self._write_pending()
+
+    def close(self):
+        """提交队列中的记忆，停止后台写入线程并关闭数据库连接"""
+        if self._writer is not None:
+            with self._queue:
+                self._closing = True
+                self._queue.notify()
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            try:
+                # 最后再提交一次：成功时此前后台写入的错误已无影响，失败时抛出本次的错误
+                self._commit_pending()
+            finally:
+                self._conn.close()
+
+    def _open_schema(self):
+        """建立表结构；旧版本的数据库先升级，全文索引和标签表随之重建"""
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        upgrade = version < _SCHEMA_VERSION and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memories'"
+        ).fetchone() is not None
+
+        if upgrade:
+            self._upgrade_tables()
+        conn.executescript(_SCHEMA)
+        if upgrade:
+            conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+            conn.execute("DELETE FROM memory_tags")
+            conn.execute(
+                "INSERT OR IGNORE INTO memory_tags(tag, row) "
+                "SELECT tags.value, memories.row FROM memories, json_each(memories.tags) AS tags"
+            )
+            # 旧版本没有记录行号上界，只能从现存的最大行号开始
+            conn.execute(
+                "UPDATE memory_meta SET value = MAX(value, (SELECT COALESCE(MAX(row) + 1, 0) FROM memories)) "
+                "WHERE key = 'next_row'"
+            )
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _upgrade_tables(self):
+        """在一个事务内补齐旧版本 memories 表缺少的列，并删除触发器和全文索引以便按新结构重建
+
+        各步骤按列是否存在判断，升级中断后再次打开数据库可以安全重做。
+        """
+        conn = self._conn
+        columns = {column[1] for column in conn.execute("PRAGMA table_info(memories)")}
+
+        conn.execute("BEGIN")
+        try:
+            for trigger in _TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute("DROP TABLE IF EXISTS memories_fts")
+
+            if "search_text" not in columns:
+                # 版本 1：检索改在小写化的 search_text 列上进行
+                conn.execute("ALTER TABLE memories ADD COLUMN search_text TEXT NOT NULL DEFAULT ''")
+                conn.executemany(
+                    "UPDATE memories SET search_text = ? WHERE row = ?",
+                    [(content.lower(), row) for row, content in conn.execute("SELECT row, content FROM memories")]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write_behind_loop(self):
+        """后台写入线程：队列满 batch_size 条或等待超过 flush_interval 秒时成组提交"""
+        while True:
+            with self._queue:
+                while not self._pending and not self._closing:
+                    self._queue.wait()
+                if self._closing:
+                    return
+                if len(self._pending) < self.batch_size:
+                    self._queue.wait(self.flush_interval)
+
+            try:
+                with self._lock:
+                    self._commit_pending()
+                with self._queue:
+                    self._writer_error = None  # 重试成功，记录均已落盘
+            except Exception as e:
+                # 记录保留在队列中，下一轮或下次 flush() 时重试；错误交给下一个调用方
+                print(f"❌ 记忆后台写入失败: {e}")
+                with self._queue:
+                    self._writer_error = e
+                    self._queue.wait(self.flush_interval)
+
+    def _enqueue(self, records: List[Tuple]):
+        """记录入队（调用方须持有队列锁）
+
+        队列由空变为非空时唤醒写入线程开始计时，攒满一批时提前唤醒它。
+        """
+        was_empty = not self._pending
+        self._pending.extend(records)
+        self.memory_count += len(records)
+        if was_empty or len(self._pending) >= self.batch_size:
+            self._queue.notify()
+
+    def _write_pending(self):
+        """提交队列中的全部记录（调用方须持有连接锁）；后台写入线程此前失败时先抛出其错误"""
+        with self._queue:
+            error, self._writer_error = self._writer_error, None
+        if error is not None:
+            raise error
+        self._commit_pending()
+
+    def _commit_pending(self):
+        """在一个事务内提交队列中的全部记录（调用方须持有连接锁）
+
+        先持连接锁再取队列，较早取出的批次一定已提交，flush() 因而可以作为屏障。
+        提交失败时记录放回队首。
+        """
+        with self._queue:
+            if not self._pending:
+                return
+            records, self._pending = self._pending, []
+
+        try:
+            self._insert(records)
+        except Exception:
+            with self._queue:
+                self._pending[:0] = records
+            raise
+        self.batches_written += 1
+        self.records_written += len(records)
+
+    def _insert(self, records: List[Tuple]):
+        """在一个事务内批量插入记录（调用方须持有连接锁）"""
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(_INSERT_SQL, records)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _records(self, items: Iterable[Union[str, Dict[str, Any]]], created_at: str) -> List[Tuple]:
+        """从当前行号上界起为条目分配行号和ID，生成待插入的记录（调用方须持有相应的锁）"""
+        records = []
+        for row, item in enumerate(items, start=self.memory_count):
+            if isinstance(item, str):
+                item = {"content": item}
+            records.append((
+                row, f"mem_{row:04d}", item["content"], item["content"].lower(), item.get("importance", 0.5),
+                json.dumps(item.get("tags") or [], ensure_ascii=False), created_at, 1
+            ))
+        return records
+
+    def _recall_rows(self, queries: List[str], limit: int, tags_all: List[str] = None,
+                     tags_any: List[str] = None, exclude: List[str] = None) -> List[List[tuple]]:
+        """在一个事务内依次累加访问次数并取出各查询的前 limit 条（调用方须持有锁）"""
+        patterns = ["%" + self._escape_like(query.lower()) + "%" for query in queries]
+        filters, filter_params = self._tag_filters(tags_all, tags_any, exclude)
+        touch_sql = _TOUCH_MATCHES_SQL.format(filters=filters)
+        top_sql = _TOP_MATCHES_SQL.format(filters=filters)
+
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(touch_sql, [(pattern, *filter_params) for pattern in patterns])
+            batches = [
+                self._conn.execute(top_sql, (pattern, *filter_params, max(limit, 0))).fetchall()
+                for pattern in patterns
+            ]
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return batches
+
+    @staticmethod
+    def _tag_filters(tags_all: List[str] = None, tags_any: List[str] = None,
+                     exclude: List[str] = None) -> Tuple[str, List[str]]:
+        """布尔标签条件对应的 SQL 片段（以 AND 开头）及其参数"""
+        clauses = []
+        params: List[Any] = []
+        if tags_all:
+            tags_all = list(dict.fromkeys(tags_all))
+            clauses.append(
+                f" AND row IN (SELECT row FROM memory_tags WHERE tag IN ({', '.join('?' * len(tags_all))}) "
+                "GROUP BY row HAVING COUNT(*) = ?)"
+            )
+            params.extend(tags_all)
+            params.append(len(tags_all))
+        if tags_any:
+            clauses.append(f" AND row IN (SELECT row FROM memory_tags WHERE tag IN ({', '.join('?' * len(tags_any))}))")
+            params.extend(tags_any)
+        if exclude:
+            clauses.append(f" AND row NOT IN (SELECT row FROM memory_tags WHERE tag IN ({', '.join('?' * len(exclude))}))")
+            params.extend(exclude)
+        return "".join(clauses), params
+
+    @staticmethod
+    def _escape_like(query: str) -> str:
+        """转义 LIKE 通配符"""
+        return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    @staticmethod
+    def _row_to_memory(row: tuple) -> Dict[str, Any]:
+        """数据库行转换为与 MJOSMemorySystem 相同结构的记忆字典"""
+        memory_id, content, importance, tags, created_at, access_count = row
+        return {
+            "id": memory_id,
+            "content": content,
+            "importance": importance,
+            "tags": json.loads(tags),
+            "created_at": datetime.fromisoformat(created_at),
+            "access_count": access_count
+        }
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+MJOS列式记忆表
+以结构数组（struct-of-arrays）方式存储记忆：数值字段存放在 array 列中，
+内容文本存放在连续的 UTF-8 字符串池里，记录以整数行号寻址；
+删除只做标记，压缩时才重排行号，记忆ID由单独的序号列决定而保持不变；
+转入冷存储的记忆只在表中保留段位置，内容按需从冷存储读取
+"""
+
+import json
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+class MemoryTable:
+    """MJOS列式记忆表"""
+
+    def __init__(self):
+        # 数值列
+        self.importance = array('d')
+        self.access_count = array('q')
+        self.created_at = array('d')  # POSIX 时间戳
+        self.serials = array('q')  # 记忆ID序号，mem_0001 对应序号 1
+        self._next_serial = 0
+        self._row_of_serial: Optional[Dict[int, int]] = {}  # 序号 -> 行号，为 None 时在首次查询时重建
+
+        # 内容字符串池：第 row 条内容为 pool[offset:offset + length]
+        self._pool = bytearray()
+        self._content_offsets = array('q')
+        self._content_lengths = array('l')
+
+        # 冷存储：cold_segment[row] 为段ID（-1 表示内容在字符串池中），冷记忆的
+        # _content_offsets[row] 存放段内序号，_content_lengths 仍为内容字节数
+        self.cold_segment = array('l')
+        self.cold_store = None
+
+        # 标签组合池：相同的标签组合只保存一份
+        self._tag_sets: List[Tuple[str, ...]] = []
+        self._tag_set_ids: Dict[Tuple[str, ...], int] = {}
+        self._tag_set_of_row = array('l')
+
+        # 删除标记：已删除的行保留行号但不再参与检索，直到压缩
+        self.alive = bytearray()
+        self.live_count = 0
+        self.live_bytes = 0  # 存活记忆的内容字节数
+
+        # 压缩次数：每次压缩重排行号，视图据此发现行号已失效并按记忆ID重新定位；
+        # 表由多线程共享时，持有者设置 lock（读写锁），视图读写字段时持锁
+        self.epoch = 0
+        self.lock = None
+
+    def append(self, content: str, importance: float, tags: List[str], created_at: float) -> int:
+        """追加一条记忆，返回行号"""
+        row = len(self.importance)
+        encoded = content.encode('utf-8')
+
+        self._content_offsets.append(len(self._pool))
+        self._content_lengths.append(len(encoded))
+        self._pool += encoded
+
+        self.importance.append(importance)
+        self.access_count.append(1)
+        self.created_at.append(created_at)
+        self.serials.append(self._next_serial)
+        if self._row_of_serial is not None:
+            self._row_of_serial[self._next_serial] = row
+        self._next_serial += 1
+        self._tag_set_of_row.append(self._intern_tags(tags))
+        self.cold_segment.append(-1)
+        self.alive.append(1)
+        self.live_count += 1
+        self.live_bytes += len(encoded)
+        return row
+
+    def append_many(self, entries: Iterable[Tuple[str, float, List[str]]], created_at: float) -> range:
+        """批量追加 (内容, 重要性, 标签)，整批共用同一创建时间，返回新行号范围"""
+        start = len(self)
+        pool_start = offset = len(self._pool)
+        chunks = []
+        for content, importance, tags in entries:
+            encoded = content.encode('utf-8')
+            chunks.append(encoded)
+            self._content_offsets.append(offset)
+            self._content_lengths.append(len(encoded))
+            offset += len(encoded)
+            self.importance.append(importance)
+            self._tag_set_of_row.append(self._intern_tags(tags))
+
+        count = len(chunks)
+        self._pool += b"".join(chunks)
+        self.access_count.extend(array('q', [1]) * count)
+        self.created_at.extend(array('d', [created_at]) * count)
+        self.cold_segment.extend(array('l', [-1]) * count)
+        serials = range(self._next_serial, self._next_serial + count)
+        self.serials.extend(serials)
+        if self._row_of_serial is not None:
+            self._row_of_serial.update(zip(serials, range(start, start + count)))
+        self._next_serial += count
+        self.alive += b"\x01" * count
+        self.live_count += count
+        self.live_bytes += offset - pool_start
+        return range(start, start + count)
+
+    def delete(self, row: int):
+        """标记删除一行（内容字节在压缩前仍占用字符串池，冷记忆则从冷存储释放）"""
+        if self.alive[row]:
+            self.alive[row] = 0
+            self.live_count -= 1
+            self.live_bytes -= self._content_lengths[row]
+            if self._row_of_serial is not None:
+                del self._row_of_serial[self.serials[row]]
+            if self.cold_segment[row] >= 0:
+                # 段内序号不是字符串池偏移，清零以免之后按热记忆读出无效字节
+                self.cold_store.release(self.cold_segment[row], self._content_offsets[row])
+                self.cold_segment[row] = -1
+                self._content_offsets[row] = 0
+                self._content_lengths[row] = 0
+
+    def row_of(self, memory_id: str) -> Optional[int]:
+        """按记忆ID查找存活记忆的行号，不存在时返回 None"""
+        prefix, _, number = memory_id.partition("_")
+        if prefix != "mem" or not number.isdigit():
+            return None
+        return self.row_of_serial(int(number))
+
+    def row_of_serial(self, serial: int) -> Optional[int]:
+        """按记忆ID序号查找存活记忆的行号，不存在时返回 None"""
+        row_of_serial = self._row_of_serial
+        if row_of_serial is None:
+            row_of_serial = self._row_of_serial = {
+                self.serials[row]: row for row in range(len(self)) if self.alive[row]
+            }
+        return row_of_serial.get(serial)
+
+    def compact(self) -> array:
+        """移除已删除的行并回收字符串池空间
+
+        返回保留下来的原行号，其下标即新行号；压缩前取得的 MemoryRecord 视图在下次访问时
+        按记忆ID重新定位，对应记忆已删除的视图则不再可用。
+        """
+        kept = array('q', (row for row in range(len(self)) if self.alive[row]))
+
+        self._repack(kept)
+
+        self.importance = array('d', (self.importance[row] for row in kept))
+        self.access_count = array('q', (self.access_count[row] for row in kept))
+        self.created_at = array('d', (self.created_at[row] for row in kept))
+        self.serials = array('q', (self.serials[row] for row in kept))
+        self._content_lengths = array('l', (self._content_lengths[row] for row in kept))
+        self._tag_set_of_row = array('l', (self._tag_set_of_row[row] for row in kept))
+        self.cold_segment = array('l', (self.cold_segment[row] for row in kept))
+        self.alive = bytearray(b"\x01") * len(kept)
+        self._row_of_serial = None
+        if self.cold_store is not None:
+            self.cold_store.remap({row: new_row for new_row, row in enumerate(kept)})
+        self.epoch += 1
+        return kept
+
+    def demote(self, rows: List[int], segment_size: int = 1000):
+        """将存活的热记忆每 segment_size 条写成冷存储的一个段，最后重建一次字符串池回收其内容"""
+        rows = [row for row in rows if self.alive[row] and self.cold_segment[row] < 0]
+        if not rows:
+            return
+
+        for start in range(0, len(rows), segment_size):
+            batch = rows[start:start + segment_size]
+            segment_id = self.cold_store.write_segment([(row, self.content(row)) for row in batch])
+            for index, row in enumerate(batch):
+                self.cold_segment[row] = segment_id
+                self._content_offsets[row] = index
+        self._repack(range(len(self)))
+
+    def promote(self, row: int) -> str:
+        """将冷记忆的内容取回字符串池，返回内容"""
+        segment_id = self.cold_segment[row]
+        index = self._content_offsets[row]
+        content = self.cold_store.read(segment_id, index)
+        self._content_offsets[row] = len(self._pool)
+        self._pool += content.encode('utf-8')
+        self.cold_segment[row] = -1
+        self.cold_store.release(segment_id, index)
+        return content
+
+    def is_cold(self, row: int) -> bool:
+        """第 row 条记忆的内容是否在冷存储中"""
+        return self.cold_segment[row] >= 0
+
+    def content_size(self, row: int) -> int:
+        """第 row 条记忆内容的字节数"""
+        return self._content_lengths[row]
+
+    @property
+    def pool_bytes(self) -> int:
+        """字符串池占用的字节数，含已删除和被改写的旧内容"""
+        return len(self._pool)
+
+    def content(self, row: int) -> str:
+        """读取第 row 条记忆的内容"""
+        if self.cold_segment[row] >= 0:
+            return self.cold_store.read(self.cold_segment[row], self._content_offsets[row])
+        offset = self._content_offsets[row]
+        return self._pool[offset:offset + self._content_lengths[row]].decode('utf-8')
+
+    def set_content(self, row: int, content: str):
+        """替换第 row 条记忆的内容（新内容追加到字符串池，旧内容在压缩时回收；冷记忆随之转回内存）"""
+        encoded = content.encode('utf-8')
+        if self.alive[row]:
+            self.live_bytes += len(encoded) - self._content_lengths[row]
+        if self.cold_segment[row] >= 0:
+            self.cold_store.release(self.cold_segment[row], self._content_offsets[row])
+            self.cold_segment[row] = -1
+        self._content_offsets[row] = len(self._pool)
+        self._content_lengths[row] = len(encoded)
+        self._pool += encoded
+
+    def tags(self, row: int) -> Tuple[str, ...]:
+        """读取第 row 条记忆的标签"""
+        return self._tag_sets[self._tag_set_of_row[row]]
+
+    def set_tags(self, row: int, tags: List[str]):
+        """替换第 row 条记忆的标签"""
+        self._tag_set_of_row[row] = self._intern_tags(tags)
+
+    def snapshot_sections(self) -> Dict[str, bytes]:
+        """导出快照分段：各列按原生字节布局直接转储"""
+        state = {
+            "live_count": self.live_count,
+            "live_bytes": self.live_bytes,
+            "long_size": self._content_lengths.itemsize,
+            "next_serial": self._next_serial,
+            "tag_sets": self._tag_sets
+        }
+        return {
+            "table": json.dumps(state, ensure_ascii=False).encode('utf-8'),
+            "importance": self.importance.tobytes(),
+            "access_count": self.access_count.tobytes(),
+            "created_at": self.created_at.tobytes(),
+            "serials": self.serials.tobytes(),
+            "pool": bytes(self._pool),
+            "content_offsets": self._content_offsets.tobytes(),
+            "content_lengths": self._content_lengths.tobytes(),
+            "tag_set_of_row": self._tag_set_of_row.tobytes(),
+            "cold_segment": self.cold_segment.tobytes(),
+            "alive": bytes(self.alive)
+        }
+
+    @classmethod
+    def from_snapshot(cls, reader, prefix: str = "", cold_store=None) -> "MemoryTable":
+        """从快照分段恢复记忆表（整列内存拷贝，不逐行解码）
+
+        快照含冷记忆时须提供 cold_store，冷存储的段数据由调用方另行恢复。
+        """
+        state = reader.json_section(prefix + "table")
+        if state["long_size"] != array('l').itemsize:
+            raise ValueError("快照的列字节布局与当前平台不兼容")
+
+        table = cls()
+        table.cold_store = cold_store
+        columns = (
+            ("importance", table.importance),
+            ("access_count", table.access_count),
+            ("created_at", table.created_at),
+            ("serials", table.serials),
+            ("content_offsets", table._content_offsets),
+            ("content_lengths", table._content_lengths),
+            ("tag_set_of_row", table._tag_set_of_row)
+        )
+        for name, column in columns:
+            column.frombytes(reader.section(prefix + name))
+        table._pool = bytearray(reader.section(prefix + "pool"))
+        table.alive = bytearray(reader.section(prefix + "alive"))
+        if prefix + "cold_segment" in reader.names():
+            table.cold_segment.frombytes(reader.section(prefix + "cold_segment"))
+            if cold_store is None and any(segment >= 0 for segment in table.cold_segment):
+                raise ValueError("快照包含冷存储中的记忆，恢复时需要指定冷存储")
+        else:
+            table.cold_segment = array('l', [-1]) * len(table)
+
+        table._tag_sets = [tuple(tags) for tags in state["tag_sets"]]
+        table._tag_set_ids = {tags: tag_set_id for tag_set_id, tags in enumerate(table._tag_sets)}
+        table.live_count = state["live_count"]
+        table.live_bytes = state["live_bytes"]
+        table._next_serial = state["next_serial"]
+        table._row_of_serial = None
+        return table
+
+    def memory_id(self, row: int) -> str:
+        """行号对应的记忆ID"""
+        return f"mem_{self.serials[row]:04d}"
+
+    def __len__(self) -> int:
+        return len(self.importance)
+
+    def __getitem__(self, row: int) -> "MemoryRecord":
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("memory row out of range")
+        return MemoryRecord(self, row)
+
+    def __iter__(self) -> Iterator["MemoryRecord"]:
+        """遍历存活的记忆"""
+        for row in range(len(self)):
+            if self.alive[row]:
+                yield MemoryRecord(self, row)
+
+    def _repack(self, rows: Iterable[int]):
+        """按给定顺序重建字符串池，只保留这些行中热记忆的内容"""
+        pool = bytearray()
+        offsets = array('q')
+        for row in rows:
+            if self.cold_segment[row] >= 0:
+                offsets.append(self._content_offsets[row])
+                continue
+            offset = self._content_offsets[row]
+            offsets.append(len(pool))
+            pool += self._pool[offset:offset + self._content_lengths[row]]
+        self._pool = pool
+        self._content_offsets = offsets
+
+    def _intern_tags(self, tags: List[str]) -> int:
+        """登记标签组合并返回其ID"""
+        key = tuple(tags)
+        tag_set_id = self._tag_set_ids.get(key)
+        if tag_set_id is None:
+            tag_set_id = len(self._tag_sets)
+            self._tag_sets.append(key)
+            self._tag_set_ids[key] = tag_set_id
+        return tag_set_id
+
+class MemoryRecord(MutableMapping):
+    """记忆表中一行的字典视图，兼容原先 memory['content'] 形式的访问
+
+    视图记住所指记忆的ID序号，表压缩重排行号后按序号重新定位；记忆已被删除时
+    访问字段抛出 KeyError。
+    """
+
+    __slots__ = ("_table", "row", "_serial", "_epoch")
+
+    _KEYS = ("id", "content", "importance", "tags", "created_at", "access_count")
+    _WRITABLE = ("importance", "access_count")
+
+    def __init__(self, table: MemoryTable, row: int):
+        self._table = table
+        self.row = row
+        self._serial = table.serials[row]
+        self._epoch = table.epoch
+
+    def __getitem__(self, key: str) -> Any:
+        lock = self._table.lock
+        if lock is None:
+            return self._get(key)
+        with lock.read():
+            return self._get(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._WRITABLE:
+            raise KeyError(f"记忆字段不可修改: {key}")
+        lock = self._table.lock
+        if lock is None:
+            getattr(self._table, key)[self._resolve()] = value
+            return
+        with lock.write():
+            getattr(self._table, key)[self._resolve()] = value
+
+    def __delitem__(self, key: str):
+        raise KeyError(f"记忆字段不可删除: {key}")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def _get(self, key: str) -> Any:
+        table, row = self._table, self._resolve()
+        if key == "id":
+            return table.memory_id(row)
+        if key == "content":
+            return table.content(row)
+        if key == "importance":
+            return table.importance[row]
+        if key == "tags":
+            return list(table.tags(row))
+        if key == "created_at":
+            return datetime.fromtimestamp(table.created_at[row])
+        if key == "access_count":
+            return table.access_count[row]
+        raise KeyError(key)
+
+    def _resolve(self) -> int:
+        """当前行号：表压缩过则按ID序号重新查找"""
+        table = self._table
+        if self._epoch != table.epoch:
+            row = table.row_of_serial(self._serial)
+            if row is None:
+                raise KeyError(f"记忆已删除: mem_{self._serial:04d}")
+            self.row, self._epoch = row, table.epoch
+        if not table.alive[self.row]:
+            raise KeyError(f"记忆已删除: mem_{self._serial:04d}")
+        return self.row
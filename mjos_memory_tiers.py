@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+MJOS冷记忆存储
+长期未访问的记忆内容成批压缩（zlib / lzma）写入磁盘段文件，内存中每段只保留
+行号、段内偏移和一个 n-gram 布隆过滤器；检索时先用布隆过滤器跳过不可能命中的段，
+再解压剩余段逐条校验。最近解压的若干段缓存在内存中
+"""
+
+import bisect
+import json
+import lzma
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Any
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台无法判断其他实例是否仍在运行，不清理它们的目录
+    fcntl = None
+
+_CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress)
+}
+
+class ColdSegment:
+    """一个冷存储段：第 i 条内容为解压后数据的字节区间 [offsets[i], offsets[i + 1])，
+    解码后的字符区间为 [char_offsets[i], char_offsets[i + 1])"""
+
+    __slots__ = ("segment_id", "codec", "rows", "offsets", "char_offsets", "bloom", "live", "compressed_size")
+
+    def __init__(self, segment_id: int, codec: str, rows: array, offsets: array, char_offsets: array,
+                 bloom: bytearray, live: int, compressed_size: int):
+        self.segment_id = segment_id
+        self.codec = codec
+        self.rows = rows  # 各条目所在的记忆表行号，-1 表示已取回或已删除
+        self.offsets = offsets
+        self.char_offsets = char_offsets
+        self.bloom = bloom
+        self.live = live
+        self.compressed_size = compressed_size
+
+class ColdMemoryStore:
+    """MJOS冷记忆存储
+
+    条目以 (段ID, 段内序号) 定位；记忆表只记录这两个整数，内容需要时再从段中读取。
+    写段、释放条目须由调用方串行执行；读取可以并发，解压缓存由内部的锁保护。
+
+    每个实例在 directory 下独占一个加锁的子目录，多个实例或重启后的新实例共用同一
+    directory 时不会覆盖彼此的段文件。段只对写入它的实例有意义，打开时删除之前的实例
+    遗留的段文件：directory 下旧布局的段文件，以及锁已释放的实例子目录。
+    """
+
+    BLOOM_BITS_PER_GRAM = 10
+    BLOOM_HASHES = 4
+    LOCK_FILE = ".lock"
+
+    def __init__(self, directory: str, compression: str = "zlib", cache_segments: int = 4):
+        if compression not in _CODECS:
+            raise ValueError(f"未知的压缩算法: {compression}")
+        self.root = Path(directory)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._remove_orphans()
+        self.directory = Path(tempfile.mkdtemp(prefix="store_", dir=self.root))
+        self._lock_fd = os.open(self.directory / self.LOCK_FILE, os.O_RDWR | os.O_CREAT)
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.compression = compression
+        self.cache_segments = cache_segments
+
+        self._segments: Dict[int, ColdSegment] = {}
+        self._next_segment_id = 0
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()  # 段ID -> 解压后的数据
+        self._cache_lock = threading.Lock()
+        self._live = 0
+
+    def write_segment(self, entries: List[Tuple[int, str]]) -> int:
+        """将 (行号, 内容) 写成一个新段，返回段ID；条目的段内序号即其在 entries 中的位置"""
+        segment_id = self._next_segment_id
+        self._next_segment_id += 1
+
+        encoded = [content.encode('utf-8') for _, content in entries]
+        offsets = array('q', [0])
+        char_offsets = array('q', [0])
+        grams = set()
+        for (_, content), data in zip(entries, encoded):
+            offsets.append(offsets[-1] + len(data))
+            char_offsets.append(char_offsets[-1] + len(content))
+            text = content.lower()
+            grams.update(text)
+            grams.update(text[i:i + 2] for i in range(len(text) - 1))
+
+        compressed = _CODECS[self.compression][0](b"".join(encoded))
+        self._path(segment_id, self.compression).write_bytes(compressed)
+
+        self._segments[segment_id] = ColdSegment(
+            segment_id, self.compression, array('q', (row for row, _ in entries)), offsets, char_offsets,
+            self._bloom(grams), len(entries), len(compressed)
+        )
+        self._live += len(entries)
+        return segment_id
+
+    def read(self, segment_id: int, index: int) -> str:
+        """读取一条冷记忆的内容"""
+        segment = self._segments[segment_id]
+        data = self._load(segment)
+        return data[segment.offsets[index]:segment.offsets[index + 1]].decode('utf-8')
+
+    def release(self, segment_id: int, index: int):
+        """条目已取回内存或已删除；段内条目全部释放后删除段文件"""
+        segment = self._segments[segment_id]
+        if segment.rows[index] < 0:
+            return
+
+        segment.rows[index] = -1
+        segment.live -= 1
+        self._live -= 1
+        if not segment.live:
+            del self._segments[segment_id]
+            with self._cache_lock:
+                self._cache.pop(segment_id, None)
+            self._path(segment_id, segment.codec).unlink(missing_ok=True)
+
+    def scan(self, query: str) -> List[int]:
+        """返回内容（小写）包含 query 的冷记忆行号，query 应已转小写"""
+        grams = [query] if len(query) == 1 else [query[i:i + 2] for i in range(len(query) - 1)]
+        probes = [self._bloom_positions(gram) for gram in grams]
+
+        matched = []
+        for segment in self._segments.values():
+            bloom = segment.bloom
+            size = len(bloom) * 8
+            if not all(bloom[(p % size) >> 3] & (1 << ((p % size) & 7)) for positions in probes for p in positions):
+                continue
+
+            matched.extend(self._search(segment, query))
+        return matched
+
+    def entries(self, grams: List[str]) -> List[Tuple[int, str]]:
+        """布隆过滤器含 grams 中任一 n-gram（一元或二元，应已转小写）的段内全部存活条目 (行号, 内容)"""
+        probes = [self._bloom_positions(gram) for gram in grams]
+
+        found = []
+        for segment in list(self._segments.values()):
+            bloom = segment.bloom
+            size = len(bloom) * 8
+            if not any(all(bloom[(p % size) >> 3] & (1 << ((p % size) & 7)) for p in positions)
+                       for positions in probes):
+                continue
+
+            data = self._load(segment)
+            offsets = segment.offsets
+            found.extend(
+                (row, data[offsets[index]:offsets[index + 1]].decode('utf-8'))
+                for index, row in enumerate(segment.rows) if row >= 0
+            )
+        return found
+
+    def remap(self, mapping: Dict[int, int]):
+        """记忆表压缩后按 旧行号 -> 新行号 重写各段的行号"""
+        for segment in self._segments.values():
+            segment.rows = array('q', (mapping.get(row, -1) if row >= 0 else -1 for row in segment.rows))
+
+    def clear(self):
+        """删除全部段"""
+        for segment in self._segments.values():
+            self._path(segment.segment_id, segment.codec).unlink(missing_ok=True)
+        self._segments.clear()
+        with self._cache_lock:
+            self._cache.clear()
+        self._live = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """冷存储统计"""
+        return {
+            "cold_memories": self._live,
+            "segments": len(self._segments),
+            "compressed_bytes": sum(segment.compressed_size for segment in self._segments.values()),
+            "cached_segments": len(self._cache),
+            "compression": self.compression
+        }
+
+    def snapshot_sections(self) -> Dict[str, bytes]:
+        """导出快照分段：段元数据和压缩后的段数据（不解压）"""
+        segments = []
+        sections = {}
+        for segment in self._segments.values():
+            segments.append({
+                "id": segment.segment_id,
+                "codec": segment.codec,
+                "live": segment.live,
+                "compressed_size": segment.compressed_size
+            })
+            prefix = f"{segment.segment_id}."
+            sections[prefix + "rows"] = segment.rows.tobytes()
+            sections[prefix + "offsets"] = segment.offsets.tobytes()
+            sections[prefix + "char_offsets"] = segment.char_offsets.tobytes()
+            sections[prefix + "bloom"] = bytes(segment.bloom)
+            sections[prefix + "data"] = self._path(segment.segment_id, segment.codec).read_bytes()
+
+        state = {"next_segment_id": self._next_segment_id, "segments": segments}
+        sections["index"] = json.dumps(state).encode('utf-8')
+        return sections
+
+    def restore_snapshot(self, reader, prefix: str = ""):
+        """从快照分段恢复，替换当前全部段（段数据写回本存储的目录）"""
+        self.apply_snapshot(self.stage_snapshot(reader, prefix))
+
+    def stage_snapshot(self, reader, prefix: str = "") -> Dict[str, Any]:
+        """读出快照中的段，段数据写入新的加锁子目录，不改动当前状态
+
+        返回值交给 apply_snapshot() 替换当前全部段，或交给 discard_snapshot() 丢弃。
+        """
+        directory = Path(tempfile.mkdtemp(prefix="store_", dir=self.root))
+        lock_fd = os.open(directory / self.LOCK_FILE, os.O_RDWR | os.O_CREAT)
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        staged = {"directory": directory, "lock_fd": lock_fd, "segments": {}, "live": 0}
+
+        try:
+            state = reader.json_section(prefix + "index")
+            staged["next_segment_id"] = state["next_segment_id"]
+            for meta in state["segments"]:
+                section = f"{prefix}{meta['id']}."
+                rows = array('q')
+                rows.frombytes(reader.section(section + "rows"))
+                offsets = array('q')
+                offsets.frombytes(reader.section(section + "offsets"))
+                char_offsets = array('q')
+                char_offsets.frombytes(reader.section(section + "char_offsets"))
+                (directory / self._filename(meta["id"], meta["codec"])).write_bytes(reader.section(section + "data"))
+
+                staged["segments"][meta["id"]] = ColdSegment(
+                    meta["id"], meta["codec"], rows, offsets, char_offsets,
+                    bytearray(reader.section(section + "bloom")), meta["live"], meta["compressed_size"]
+                )
+                staged["live"] += meta["live"]
+        except BaseException:
+            self.discard_snapshot(staged)
+            raise
+        return staged
+
+    def apply_snapshot(self, staged: Dict[str, Any]):
+        """以 stage_snapshot() 读出的段替换当前全部段，原目录随之删除"""
+        self.clear()
+        os.close(self._lock_fd)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+        self.directory = staged["directory"]
+        self._lock_fd = staged["lock_fd"]
+        self._segments = staged["segments"]
+        self._next_segment_id = staged["next_segment_id"]
+        self._live = staged["live"]
+
+    def discard_snapshot(self, staged: Dict[str, Any]):
+        """丢弃 stage_snapshot() 读出的段"""
+        os.close(staged["lock_fd"])
+        shutil.rmtree(staged["directory"], ignore_errors=True)
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _search(self, segment: ColdSegment, query: str) -> List[int]:
+        """在一个段中查找内容包含 query 的存活条目
+
+        整段解码并转小写后用 str.find 查找，命中后直接跳到下一条目的起点继续；
+        转小写改变了字符数时（极少见）退回逐条校验。
+        """
+        rows = segment.rows
+        if not query:
+            return [row for row in rows if row >= 0]
+
+        data = self._load(segment)
+        text = data.decode('utf-8')
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            offsets = segment.offsets
+            return [
+                row for index, row in enumerate(rows)
+                if row >= 0 and query in data[offsets[index]:offsets[index + 1]].decode('utf-8').lower()
+            ]
+
+        starts = segment.char_offsets
+        matched = []
+        position = lowered.find(query)
+        while position >= 0:
+            index = bisect.bisect_right(starts, position) - 1
+            end = starts[index + 1]
+            # 跨越条目边界的命中不算；无论是否命中，本条目内都不必再找
+            if position + len(query) <= end and rows[index] >= 0:
+                matched.append(rows[index])
+            position = lowered.find(query, end)
+        return matched
+
+    def _load(self, segment: ColdSegment) -> bytes:
+        """取得段的解压数据（LRU 缓存最近的若干段）"""
+        with self._cache_lock:
+            data = self._cache.get(segment.segment_id)
+            if data is not None:
+                self._cache.move_to_end(segment.segment_id)
+                return data
+
+        # 解压在锁外进行，并发读取同一段时可能重复解压，结果相同
+        compressed = self._path(segment.segment_id, segment.codec).read_bytes()
+        data = _CODECS[segment.codec][1](compressed)
+        with self._cache_lock:
+            self._cache[segment.segment_id] = data
+            while len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+        return data
+
+    def _remove_orphans(self):
+        """删除之前的实例遗留的段文件"""
+        for path in self.root.glob("segment_*"):
+            path.unlink(missing_ok=True)
+        if fcntl is None:
+            return
+
+        for directory in self.root.glob("store_*"):
+            try:
+                fd = os.open(directory / self.LOCK_FILE, os.O_RDWR)
+            except OSError:
+                continue  # 刚创建、尚未加锁的目录
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # 实例仍在使用
+            else:
+                shutil.rmtree(directory, ignore_errors=True)
+            finally:
+                os.close(fd)
+
+    def _path(self, segment_id: int, codec: str) -> Path:
+        return self.directory / self._filename(segment_id, codec)
+
+    @staticmethod
+    def _filename(segment_id: int, codec: str) -> str:
+        return f"segment_{segment_id:06d}.{codec}"
+
+    def _bloom(self, grams: Iterable[str]) -> bytearray:
+        """以段内全部 n-gram 建立布隆过滤器"""
+        grams = list(grams)
+        size = max(64, (len(grams) * self.BLOOM_BITS_PER_GRAM + 7) // 8 * 8)
+        bloom = bytearray(size // 8)
+        for gram in grams:
+            for position in self._bloom_positions(gram):
+                position %= size
+                bloom[position >> 3] |= 1 << (position & 7)
+        return bloom
+
+    def _bloom_positions(self, gram: str) -> List[int]:
+        """双重哈希得到 BLOOM_HASHES 个位置（未按过滤器大小取模）"""
+        encoded = gram.encode('utf-8')
+        first = zlib.crc32(encoded)
+        second = zlib.adler32(encoded) | 1
+        return [first + i * second for i in range(self.BLOOM_HASHES)]
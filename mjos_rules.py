@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+MJOS关键词规则引擎
+将角色观点路由、任务分配等关键词规则编译为 Aho-Corasick 多模式匹配自动机，
+一次扫描文本即可得到所有规则表的匹配结果，耗时与文本长度成线性关系，与规则数量无关
+"""
+
+import json
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Any, Tuple
+
+# 规则表格式：
+#   {表名: {"rules": [{"id": ..., "keywords": [...], "result": ...}, ...], "default": ...}}
+# 同一表内按规则顺序决定优先级，靠前的规则优先命中；关键词匹配区分大小写
+DEFAULT_RULES: Dict[str, Dict[str, Any]] = {
+    "xiaozhi": {
+        "rules": [
+            {
+                "id": "xiaozhi.architecture",
+                "keywords": ["系统", "架构"],
+                "result": "从战略角度看，需要建立可扩展的架构基础，确保长期技术竞争力。建议采用模块化设计，为未来发展预留空间。"
+            },
+            {
+                "id": "xiaozhi.user",
+                "keywords": ["用户", "体验"],
+                "result": "战略重点应该放在用户价值创造上。建议深入分析用户需求，制定差异化的价值主张。"
+            },
+            {
+                "id": "xiaozhi.performance",
+                "keywords": ["性能", "优化"],
+                "result": "从战略视角，性能优化应该与业务目标对齐。建议优先优化核心业务流程，提升整体竞争优势。"
+            }
+        ],
+        "default": "建议从全局视角分析问题，制定系统性解决方案，确保决策与长期战略目标一致。"
+    },
+    "xiaomei": {
+        "rules": [
+            {
+                "id": "xiaomei.interface",
+                "keywords": ["界面", "UI"],
+                "result": "用户体验设计应该遵循简洁直观的原则。建议采用用户中心的设计方法，通过原型测试验证设计效果。"
+            },
+            {
+                "id": "xiaomei.workflow",
+                "keywords": ["流程", "操作"],
+                "result": "优化用户操作流程，减少认知负担。建议简化操作步骤，提供清晰的视觉反馈和引导。"
+            },
+            {
+                "id": "xiaomei.performance",
+                "keywords": ["性能"],
+                "result": "从用户体验角度，响应速度直接影响用户满意度。建议优化关键交互的响应时间，提供加载状态提示。"
+            }
+        ],
+        "default": "建议从用户角度思考问题，确保解决方案能够提升用户满意度和使用效率。"
+    },
+    "xiaoma": {
+        "rules": [
+            {
+                "id": "xiaoma.architecture",
+                "keywords": ["架构", "系统"],
+                "result": "技术架构应该考虑可维护性、可扩展性和性能。建议采用微服务架构，使用容器化部署，确保系统稳定性。"
+            },
+            {
+                "id": "xiaoma.performance",
+                "keywords": ["性能"],
+                "result": "性能优化需要从多个层面考虑：算法优化、数据库优化、缓存策略、异步处理等。建议先进行性能分析，找出瓶颈点。"
+            },
+            {
+                "id": "xiaoma.security",
+                "keywords": ["安全"],
+                "result": "安全是技术实现的重要考虑。建议实施多层安全防护：身份认证、数据加密、访问控制、安全审计等。"
+            }
+        ],
+        "default": "技术实现应该遵循最佳实践，确保代码质量、可测试性和可维护性。建议采用敏捷开发方法，持续集成和部署。"
+    },
+    "assignment": {
+        "rules": [
+            {"id": "assignment.xiaozhi", "keywords": ["战略", "架构"], "result": "莫小智"},
+            {"id": "assignment.xiaomei", "keywords": ["用户", "体验"], "result": "莫小美"},
+            {"id": "assignment.xiaoma", "keywords": ["技术", "代码"], "result": "莫小码"}
+        ],
+        "default": "MJOS团队"
+    }
+}
+
+class KeywordRuleEngine:
+    """MJOS关键词规则引擎（Aho-Corasick自动机）"""
+
+    def __init__(self, rule_tables: Dict[str, Dict[str, Any]] = None):
+        if rule_tables is None:
+            rule_tables = DEFAULT_RULES
+
+        self.rule_tables = rule_tables
+
+        # 自动机：状态转移表、失败指针、每个状态输出的 (表名, 规则序号)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, int]]] = [[]]
+
+        for table, spec in rule_tables.items():
+            for index, rule in enumerate(spec.get("rules", [])):
+                for keyword in rule["keywords"]:
+                    if keyword:
+                        self._add_keyword(keyword, (table, index))
+
+        self._build_failure_links()
+
+    @classmethod
+    def from_file(cls, path: str) -> "KeywordRuleEngine":
+        """从JSON配置文件加载规则表"""
+        with open(Path(path), 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def scan(self, text: str) -> Dict[str, int]:
+        """单次扫描文本，返回每个规则表命中的最高优先级规则序号"""
+        matches: Dict[str, int] = {}
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for table, index in output[state]:
+                if index < matches.get(table, index + 1):
+                    matches[table] = index
+
+        return matches
+
+    def resolve(self, table: str, matches: Dict[str, int]) -> str:
+        """根据扫描结果取出规则表的输出，未命中时返回默认值"""
+        spec = self.rule_tables[table]
+        index = matches.get(table)
+        if index is None:
+            return spec.get("default", "")
+        return spec["rules"][index]["result"]
+
+    def route(self, table: str, text: str) -> str:
+        """扫描文本并返回单个规则表的输出"""
+        return self.resolve(table, self.scan(text))
+
+    def _add_keyword(self, keyword: str, target: Tuple[str, int]):
+        """将关键词插入字典树"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(target)
+
+    def _build_failure_links(self):
+        """广度优先构建失败指针，并合并后缀状态的输出"""
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+MJOS记忆相似度检索
+将记忆内容向量化为字符 n-gram 特征哈希 TF-IDF 向量，用随机投影 LSH 分桶，
+检索时只对同桶（及相邻桶）候选计算余弦相似度，得到近似 top-k；
+完全本地计算，不依赖网络模型
+"""
+
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+class MemorySimilarityIndex:
+    """TF-IDF + 随机投影 LSH 相似度索引
+
+    各记录的稀疏向量 (特征, 1 + ln tf) 依次追加在连续的缓冲区中，按行号记录起点和长度，
+    打分时整批向量化计算。文档频率随记录增删实时维护；LSH 签名按登记时的 IDF 计算，
+    候选的余弦相似度则按当前 IDF 精确重算。记录数较少时直接对全部记录精确打分。
+    """
+
+    def __init__(self, dim: int = 1 << 14, ngram_sizes: Tuple[int, ...] = (1, 2, 3),
+                 tables: int = 24, bits: int = 10, probes: int = 4, exact_threshold: int = 20000,
+                 seed: int = 42):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes  # 每张表额外探查的相邻桶数（翻转投影最接近 0 的若干位）
+        self.exact_threshold = exact_threshold  # 记录数不超过该值时直接对全部记录精确计算
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((dim, tables * bits), dtype=np.float32)  # 按特征取行，连续访问
+        self._bit_values = 1 << np.arange(bits, dtype=np.int64)
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(tables)]
+        self._df = np.zeros(dim, dtype=np.int64)
+        self._count = 0
+
+        # 稀疏向量缓冲区，删除的记录在缓冲区中留下空洞，空洞过多时整理
+        self._features = np.zeros(1024, dtype=np.int32)
+        self._tf = np.zeros(1024, dtype=np.float32)
+        self._used = 0
+        self._garbage = 0
+
+        # 按行号索引：向量起点、长度（0 表示未登记）和各表桶键
+        self._starts = np.zeros(1024, dtype=np.int64)
+        self._lengths = np.zeros(1024, dtype=np.int64)
+        self._keys = np.zeros((1024, tables), dtype=np.int64)
+
+    def add(self, row: int, text: str):
+        """登记一条记录（已登记的行先移除再重新登记）"""
+        self._reserve_rows(row + 1)
+        if self._lengths[row]:
+            self.remove(row)
+
+        features, tf = self._vectorize(text)
+        if not len(features):
+            return
+
+        self._reserve_buffer(len(features))
+        start = self._used
+        self._features[start:start + len(features)] = features
+        self._tf[start:start + len(features)] = tf
+        self._used += len(features)
+        self._starts[row] = start
+        self._lengths[row] = len(features)
+        self._df[features] += 1
+        self._count += 1
+
+        projection = (tf * self._idf(features)) @ self._planes[features]
+        keys = (projection.reshape(self.tables, self.bits) > 0) @ self._bit_values
+        self._keys[row] = keys
+        for table, key in enumerate(keys.tolist()):
+            self._buckets[table].setdefault(key, set()).add(row)
+
+    def remove(self, row: int):
+        """移除一条记录"""
+        if row >= len(self._lengths) or not self._lengths[row]:
+            return
+
+        start, length = self._starts[row], self._lengths[row]
+        self._df[self._features[start:start + length]] -= 1
+        for table, key in enumerate(self._keys[row].tolist()):
+            rows = self._buckets[table].get(key)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._buckets[table][key]
+
+        self._lengths[row] = 0
+        self._count -= 1
+        self._garbage += int(length)
+
+    def query(self, text: str, limit: int = 5, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """返回余弦相似度近似最高的 (行号, 相似度)，按相似度降序，同分时行号小的优先"""
+        features, tf = self._vectorize(text)
+        if limit <= 0 or not len(features) or not self._count:
+            return []
+
+        idf = self._idf()
+        weights = tf * idf[features]
+
+        if self._count <= self.exact_threshold:
+            rows = np.flatnonzero(self._lengths)
+        else:
+            projection = weights @ self._planes[features]
+            candidates = set()
+            for table in range(self.tables):
+                for key in self._probe_keys(projection[table * self.bits:(table + 1) * self.bits]):
+                    candidates |= self._buckets[table].get(key, set())
+            if not candidates:
+                return []
+            rows = np.array(sorted(candidates), dtype=np.int64)
+
+        query_vector = np.zeros(self.dim, dtype=np.float32)
+        query_vector[features] = weights / np.linalg.norm(weights)
+        scores = self._cosine(rows, query_vector, idf)
+
+        if limit < len(rows):
+            keep = np.argpartition(-scores, limit - 1)[:limit]
+            # 与第 limit 名同分的行也纳入比较，保证同分时按行号确定
+            keep = np.flatnonzero(scores >= scores[keep].min())
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))[:limit]
+        return [(int(rows[i]), float(scores[i])) for i in order if scores[i] > min_score]
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        """未登记文本与查询的余弦相似度（按当前 IDF），用于不在索引中的记录"""
+        features, tf = self._vectorize(query)
+        if not len(features):
+            return [0.0] * len(texts)
+
+        idf = self._idf()
+        weights = tf * idf[features]
+        query_vector = np.zeros(self.dim, dtype=np.float32)
+        query_vector[features] = weights / np.linalg.norm(weights)
+
+        scores = []
+        for text in texts:
+            features, tf = self._vectorize(text)
+            if not len(features):
+                scores.append(0.0)
+                continue
+            weights = tf * idf[features]
+            scores.append(float(weights @ query_vector[features] / np.linalg.norm(weights)))
+        return scores
+
+    def shrink(self):
+        """大批记录移除后整理缓冲区并按实际用量重新分配，归还空洞占用的内存"""
+        if self._garbage <= self._used // 2:
+            return
+        self._compact_buffer()
+        capacity = max(1024, 2 * self._used)
+        self._features = self._features[:capacity].copy()
+        self._tf = self._tf[:capacity].copy()
+
+    def remap(self, mapping: Dict[int, int]):
+        """记忆表压缩后按 旧行号 -> 新行号 重写索引"""
+        old_rows = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+        new_rows = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+        old_rows, new_rows = old_rows[old_rows < len(self._lengths)], new_rows[old_rows < len(self._lengths)]
+
+        starts, lengths, keys = self._starts, self._lengths, self._keys
+        size = len(mapping) + 1
+        self._starts = np.zeros(size, dtype=np.int64)
+        self._lengths = np.zeros(size, dtype=np.int64)
+        self._keys = np.zeros((size, self.tables), dtype=np.int64)
+        self._starts[new_rows] = starts[old_rows]
+        self._lengths[new_rows] = lengths[old_rows]
+        self._keys[new_rows] = keys[old_rows]
+
+        for buckets in self._buckets:
+            for key, rows in buckets.items():
+                buckets[key] = {mapping[row] for row in rows if row in mapping}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _cosine(self, rows: np.ndarray, query_vector: np.ndarray, idf: np.ndarray) -> np.ndarray:
+        """指定行与（已归一化的）查询向量的余弦相似度"""
+        starts, lengths = self._starts[rows], self._lengths[rows]
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+
+        features = self._features[positions]
+        weights = self._tf[positions] * idf[features]
+        dots = np.add.reduceat(weights * query_vector[features], offsets)
+        norms = np.sqrt(np.add.reduceat(weights * weights, offsets))
+        return dots / norms
+
+    def _vectorize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """文本的哈希特征及其次线性词频 1 + ln(tf)"""
+        text = " ".join(text.lower().split())
+        counts: Dict[int, int] = {}
+        for size in self.ngram_sizes:
+            for i in range(len(text) - size + 1):
+                feature = zlib.crc32(text[i:i + size].encode('utf-8')) % self.dim
+                counts[feature] = counts.get(feature, 0) + 1
+
+        features = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        return features, tf
+
+    def _idf(self, features: Optional[np.ndarray] = None) -> np.ndarray:
+        """平滑 IDF：ln((1 + N) / (1 + df)) + 1，给定 features 时只计算这些特征"""
+        df = self._df if features is None else self._df[features]
+        return (np.log((1.0 + self._count) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def _probe_keys(self, projection: np.ndarray) -> List[int]:
+        """单张表要探查的桶：所在桶，以及翻转最不确定的若干位后的相邻桶"""
+        key = int((projection > 0) @ self._bit_values)
+        nearest = np.argsort(np.abs(projection))[:self.probes]
+        return [key] + [key ^ (1 << int(bit)) for bit in nearest]
+
+    def _reserve_rows(self, size: int):
+        """按需扩充按行号索引的数组（容量翻倍）"""
+        if size <= len(self._lengths):
+            return
+        capacity = max(size, 2 * len(self._lengths))
+        for name in ("_starts", "_lengths", "_keys"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _reserve_buffer(self, extra: int):
+        """确保缓冲区还能追加 extra 个特征；空洞超过一半时先整理"""
+        if self._used + extra <= len(self._features):
+            return
+
+        if self._garbage > self._used // 2:
+            self._compact_buffer()
+
+        if self._used + extra > len(self._features):
+            capacity = max(self._used + extra, 2 * len(self._features))
+            for name in ("_features", "_tf"):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:self._used] = old[:self._used]
+                setattr(self, name, new)
+
+    def _compact_buffer(self):
+        """把各记录的向量依次移到缓冲区开头，消除删除留下的空洞"""
+        rows = np.flatnonzero(self._lengths)
+        lengths = self._lengths[rows]
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(self._starts[rows] - offsets, lengths) + np.arange(int(lengths.sum()))
+        self._features[:len(positions)] = self._features[positions]
+        self._tf[:len(positions)] = self._tf[positions]
+        self._starts[rows] = offsets
+        self._used = len(positions)
+        self._garbage = 0
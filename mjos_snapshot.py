@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+MJOS快照文件
+长度前缀的二进制分段格式，读取时通过 mmap 映射文件，按需取出各分段而不整体解码
+
+文件布局（小端序）：
+    魔数 b"MJOSSNP1"
+    u32 分段数
+    每个分段：u16 名称长度 | 名称(UTF-8) | u64 偏移 | u64 长度
+    各分段数据
+"""
+
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+SNAPSHOT_MAGIC = b"MJOSSNP1"
+
+_COUNT = struct.Struct("<I")
+_NAME_LENGTH = struct.Struct("<H")
+_EXTENT = struct.Struct("<QQ")
+
+def write_snapshot(path: str, sections: Dict[str, bytes]):
+    """写入快照文件（先写临时文件再替换，避免留下半个快照）"""
+    encoded_names = [(name.encode('utf-8'), data) for name, data in sections.items()]
+
+    header_size = len(SNAPSHOT_MAGIC) + _COUNT.size + sum(
+        _NAME_LENGTH.size + len(name) + _EXTENT.size for name, _ in encoded_names
+    )
+
+    header = [SNAPSHOT_MAGIC, _COUNT.pack(len(encoded_names))]
+    offset = header_size
+    for name, data in encoded_names:
+        header.append(_NAME_LENGTH.pack(len(name)))
+        header.append(name)
+        header.append(_EXTENT.pack(offset, len(data)))
+        offset += len(data)
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(target.name + ".tmp")
+    with open(temporary, 'wb') as f:
+        f.writelines(header)
+        for _, data in encoded_names:
+            f.write(data)
+    temporary.replace(target)
+
+class SnapshotReader:
+    """MJOS快照读取器：映射文件并按名称取出分段"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self._sections: Dict[str, Tuple[int, int]] = {}
+
+        if self._view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的MJOS快照文件: {path}")
+
+        position = len(SNAPSHOT_MAGIC)
+        (count,) = _COUNT.unpack_from(self._view, position)
+        position += _COUNT.size
+        for _ in range(count):
+            (name_length,) = _NAME_LENGTH.unpack_from(self._view, position)
+            position += _NAME_LENGTH.size
+            name = bytes(self._view[position:position + name_length]).decode('utf-8')
+            position += name_length
+            self._sections[name] = _EXTENT.unpack_from(self._view, position)
+            position += _EXTENT.size
+
+    def names(self) -> List[str]:
+        """快照中的分段名称"""
+        return list(self._sections)
+
+    def extent(self, name: str) -> Tuple[int, int]:
+        """分段在文件中的 (偏移, 长度)，供直接按偏移读取文件的调用方使用"""
+        return self._sections[name]
+
+    def section(self, name: str) -> memoryview:
+        """分段数据的只读视图（零拷贝，读取器关闭后失效）"""
+        offset, length = self._sections[name]
+        return self._view[offset:offset + length]
+
+    def json_section(self, name: str) -> Any:
+        """按JSON解码分段"""
+        return json.loads(bytes(self.section(name)))
+
+    def close(self):
+        """释放映射并关闭文件"""
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+MJOS记忆系统并发压力测试
+多个读线程与写线程共享同一个 MJOSMemorySystem：校验访问次数精确累加（有无检索缓存两种情况），
+以及读写混合（含淘汰、压缩、合并、冷热分层）结束后索引与全量扫描结果一致
+用法：python3 test-memory-concurrency.py
+"""
+
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import threading
+import traceback
+
+from mjos_demo import MJOSMemorySystem
+
+READERS = 8
+WRITERS = 3
+RECALLS_PER_READER = 200
+OPERATIONS_PER_WRITER = 300
+
+def run_threads(targets):
+    """并发运行各线程，返回它们抛出的异常"""
+    errors = []
+
+    def guarded(target, *args):
+        try:
+            target(*args)
+        except Exception as error:
+            traceback.print_exc()
+            errors.append(error)
+
+    threads = [threading.Thread(target=guarded, args=(target,) + tuple(args)) for target, *args in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def test_access_counts(recall_cache_size: int):
+    """只读负载：每次检索命中的记忆访问次数恰好加一"""
+    memory = MJOSMemorySystem(recall_cache_size=recall_cache_size)
+    memory.remember_many([f"共享记忆 {i} 关键词" for i in range(200)] + [f"其他 {i}" for i in range(200)])
+
+    def reader():
+        for _ in range(RECALLS_PER_READER):
+            assert len(memory.recall("关键词", 5)) == 5
+            memory.touch("mem_0000")
+
+    errors = run_threads([(reader,)] * READERS)
+    assert not errors, errors
+
+    memory.get("mem_0000")  # 写回缓存命中累积的访问次数
+    access_count = memory.memories.access_count
+    expected = 1 + READERS * RECALLS_PER_READER
+    assert all(access_count[row] == expected for row in range(1, 200)), sorted(set(access_count[:200]))
+    assert access_count[0] == 1 + 2 * READERS * RECALLS_PER_READER, access_count[0]
+    assert all(access_count[row] == 1 for row in range(200, 400))
+
+def test_mixed_load():
+    """读写混合：写线程存入、删除、改写、压缩、合并、衰减、转冷，容量上限触发淘汰"""
+    memory = MJOSMemorySystem(max_entries=500, cold_dir=tempfile.mkdtemp(prefix="mjos_cold_"))
+    ids = []
+    finished = []
+    stop = threading.Event()
+
+    def writer(seed: int):
+        rnd = random.Random(seed)
+        try:
+            for i in range(OPERATIONS_PER_WRITER):
+                choice = rnd.random()
+                if choice < 0.5:
+                    ids.append(memory.remember(f"写入 {seed}-{i} 主题{i % 7}", rnd.random(), [f"t{i % 3}"]))
+                elif choice < 0.6:
+                    memory.remember_many([f"批量 {seed}-{i}-{j} 主题{j % 7}" for j in range(5)])
+                elif choice < 0.75 and ids:
+                    memory.forget(rnd.choice(ids))
+                elif choice < 0.85 and ids:
+                    memory.update(rnd.choice(ids), content=f"改写 主题{i % 7}")
+                elif choice < 0.9:
+                    memory.compact_memories(0.1)
+                elif choice < 0.95:
+                    memory.consolidate_memories(50)
+                elif choice < 0.97:
+                    memory.decay_memories()
+                else:
+                    memory.demote_memories(cold_after=-1, hot_access=3, segment_size=20)
+        finally:
+            finished.append(seed)
+            if len(finished) == WRITERS:
+                stop.set()
+
+    def reader(seed: int):
+        rnd = random.Random(seed)
+        while not stop.is_set():
+            query = f"主题{rnd.randrange(7)}"
+            for record in memory.recall(query, 5, tags_any=["t1", "t2"] if rnd.random() < 0.3 else None):
+                # 返回后记忆可能被其他线程改写，或删除并压缩掉
+                try:
+                    content = record["content"]
+                except KeyError:
+                    continue
+                assert query in content or content.startswith("改写"), (query, content)
+            memory.recall_many([query, "写入"], 3)
+            if ids:
+                memory_id = rnd.choice(ids)
+                memory.get(memory_id)
+                memory.touch(memory_id)
+            if rnd.random() < 0.1:
+                memory.recall_similar(query, 3)
+            memory.stats()
+
+    errors = run_threads([(writer, seed) for seed in range(WRITERS)] + [(reader, seed) for seed in range(5)])
+    assert not errors, errors
+
+    table = memory.memories
+    live = [row for row in range(len(table)) if table.alive[row]]
+    assert table.live_count == len(live) <= 500
+    for query in [f"主题{i}" for i in range(7)] + ["写入", "批量"]:
+        recalled = {record["id"] for record in memory.recall(query, 10 ** 6)}
+        scanned = {table.memory_id(row) for row in live if query in table.content(row).lower()}
+        assert recalled == scanned, query
+
+def main() -> int:
+    sys.setswitchinterval(1e-6)  # 频繁切换线程，尽量暴露竞争
+    tests = [
+        ("访问计数（无检索缓存）", lambda: test_access_counts(0)),
+        ("访问计数（有检索缓存）", lambda: test_access_counts(128)),
+        ("读写混合", test_mixed_load)
+    ]
+
+    failed = 0
+    for name, test in tests:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                test()
+            print(f"✅ {name}")
+        except Exception as error:
+            failed += 1
+            print(f"❌ {name}: {error!r}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())